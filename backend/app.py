@@ -1,388 +1,450 @@
 # YouTube Clone - Python Backend API
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
-import sqlite3
-from datetime import datetime, timedelta
-import json
-import hashlib
-import jwt
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from datetime import datetime
+from werkzeug.security import generate_password_hash, safe_join
 import os
-import base64
-import cv2
-import numpy as np
-from moviepy.editor import VideoFileClip
-import requests
+import signal
+import threading
+import time
+from db import get_db, pool
+from search import build_match_query, rank_expression, render_highlight, snippet_columns
+from buffers import CounterBuffer, ProgressBuffer, stop_all
+from likes import LIKE_TYPES, LikeCountReconciler, toggle_likes
+from recommendations import recommender, trending_videos
+from trending import rebuild_trending, trending
+from feed import fan_out, feed_page, rebuild_inboxes, subscribe, unsubscribe
+from cache import ResponseCache, TTLCache
+from media import MEDIA_ROOT, VIDEO_ROOT
+from jobs import MAX_INTERVALS, MAX_THUMBNAIL_TIME, JobQueue
+from migrations import migrate
+from streaming import StreamSlots, stream_file
+from pagination import InvalidCursor, encode_cursor, decode_cursor, parse_limit, parse_fields
+from realtime import CommentBroadcaster, queue_options, video_room
+from metrics import profiler, registry, request_seconds, socket_connections, socket_event, stats_collector
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "youtube_clone_secret_key_2025"
-CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+CORS(app, expose_headers=["X-Next-Cursor"])
+# Set YOUTUBE_MESSAGE_QUEUE (redis://..., or local:// in-process) to share
+# rooms between several server processes
+socketio = SocketIO(app, cors_allowed_origins="*", **queue_options(os.environ.get("YOUTUBE_MESSAGE_QUEUE")))
+
+# New comments reach only the viewers of their video; bursts become digests
+comment_broadcaster = CommentBroadcaster(socketio.emit)
+
+# Page views are buffered in memory and written in batches
+view_counter = CounterBuffer("videos", ["views_count"], interval=2.0, max_pending=500)
+like_counts = LikeCountReconciler(interval=1.0, max_pending=500)
+
+MAX_LIKE_EVENTS = 500
+VIDEO_PRIVACY = ("public", "unlisted", "private")
+
+def _apply_media_result(conn, video_id, manifest):
+    """Store probed duration and thumbnail URL on the processed video"""
+    if video_id is not None:
+        conn.execute("UPDATE videos SET duration = ?, thumbnail = ? WHERE id = ?",
+                     (manifest["duration"], manifest["thumbnail"], video_id))
+
+def _emit_job_event(event, data):
+    """Job events go to the room of the video being processed"""
+    if event == "job_completed" and data.get("video_id") is not None:
+        # Sent after the new duration and thumbnail were committed
+        response_cache.invalidate(f"video:{data['video_id']}")
+    if data.get("video_id") is not None:
+        socketio.emit(event, data, to=video_room(data["video_id"]))
+    else:
+        socketio.emit(event, data)
+
+stream_slots = StreamSlots()
+
+# Media processing runs on a process pool so decoding never blocks a request
+job_queue = JobQueue(emit=_emit_job_event, on_success=_apply_media_result)
+
+# Recommendation results per (user, candidate set version); a user's entry is
+# dropped as soon as their new watch history is written
+recommendation_cache = TTLCache(max_entries=50000, ttl=300.0)
+
+def _invalidate_recommendations(items):
+    for user_id in {user_id for (user_id, _), _ in items}:
+        recommendation_cache.invalidate((user_id, recommender.version))
+
+# Progress ticks are coalesced per viewer and video and upserted in batches
+watch_progress = ProgressBuffer(interval=5.0, max_pending=5000, on_flush=_invalidate_recommendations)
+
+# Built JSON of the video read endpoints, tagged with the rows they came from
+response_cache = ResponseCache(max_entries=10000, ttl=60.0)
+
+# Set YOUTUBE_PROFILING=1 to enable /debug/profile
+PROFILING = os.environ.get("YOUTUBE_PROFILING") == "1"
+MAX_PROFILE_SECONDS = 60
+
+registry.collector(stats_collector("youtube_db_pool", {"default": pool.stats}, gauges=("in_use", "idle", "max_size")))
+registry.collector(stats_collector("youtube_buffer", {
+    "views": view_counter.stats,
+    "likes": like_counts.stats,
+    "watch_progress": watch_progress.stats,
+    "trending": trending.stats,
+}, gauges=("pending", "last_flush_seconds", "max_flush_seconds", "lists")))
+registry.collector(stats_collector("youtube_cache", {
+    "recommendations": recommendation_cache.stats,
+    "responses": response_cache.stats,
+}, gauges=("entries", "hit_ratio", "tracked_tags")))
+registry.collector(stats_collector("youtube_comment_broadcast", {"default": comment_broadcaster.stats},
+                                   gauges=("hot_videos", "tracked_videos")))
+
+@registry.collector
+def _collect_live_state():
+    jobs = job_queue.stats()
+    connected = socket_connections.value("connect") - socket_connections.value("disconnect")
+    return [
+        ("youtube_jobs", "gauge", "Jobs by status", [({"status": status}, count) for status, count in jobs["by_status"].items()]),
+        ("youtube_jobs_in_flight", "gauge", "Jobs executing in this process", [({}, jobs["in_flight"])]),
+        ("youtube_streams_active", "gauge", "Video responses being streamed", [({}, stream_slots.active())]),
+        ("youtube_socket_clients", "gauge", "Connected Socket.IO clients", [({}, connected)]),
+    ]
+
+def _route_label():
+    # The URL rule, not the path, keeps label cardinality bounded
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    if PROFILING:
+        profiler.enter(_route_label())
+
+@app.after_request
+def _observe_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        request_seconds.observe(time.perf_counter() - started, request.method, _route_label(), str(response.status_code))
+    return response
+
+@app.teardown_request
+def _leave_profiler(error=None):
+    if PROFILING:
+        profiler.leave()
+
+ROLES = ("all", "api", "media")
+
+_previous_sigterm = signal.SIG_DFL
+
+def _stop_buffers(signum, frame):
+    """On SIGTERM, write out every buffered counter and event, then do what
+    the previous handler would have done (by default, exit)"""
+    stop_all()
+    if callable(_previous_sigterm):
+        _previous_sigterm(signum, frame)
+    elif _previous_sigterm != signal.SIG_IGN:
+        raise SystemExit(128 + signum)
+
+def create_app(role=None):
+    """Prepare the database and this process's background work; returns the app.
+
+    ``role`` (default: YOUTUBE_ROLE, else "all") lets API and media work run
+    in separate processes: "api" serves HTTP and Socket.IO and leaves queued
+    jobs to a media worker, "media" only runs the job queue, and "all" does
+    both. OpenCV is not imported until a job needs it, and NumPy only by
+    the recommendation engine's first load, which serving processes start
+    on a background thread, so no process waits for either to start.
+    """
+    role = role or os.environ.get("YOUTUBE_ROLE", "all")
+    if role not in ROLES:
+        raise ValueError(f"role must be one of: {', '.join(ROLES)}")
+    init_db()
+    # atexit alone never runs when a supervisor sends SIGTERM; handlers can
+    # only be installed from the main thread
+    global _previous_sigterm
+    current = signal.getsignal(signal.SIGTERM)
+    if threading.current_thread() is threading.main_thread() and current is not _stop_buffers:
+        _previous_sigterm = current
+        signal.signal(signal.SIGTERM, _stop_buffers)
+    if role in ("all", "media"):
+        job_queue.start()
+    if role in ("all", "api"):
+        recommender.load_async()
+    return app
 
 # Database setup
 def init_db():
-    conn = sqlite3.connect("youtube.db")
+    """Apply pending migrations and seed sample data into an empty database"""
+    with get_db() as conn:
+        migrate(conn)
+        if _is_empty(conn):
+            _insert_sample_data(conn)
+
+def _is_empty(conn):
+    return conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+def _insert_sample_data(conn):
+    # Hashed once, and only on first boot: PBKDF2 is deliberately slow
+    password_hash = generate_password_hash("password123")
+    conn.execute("BEGIN IMMEDIATE")
+    if not _is_empty(conn):
+        # Another process seeded it while we were hashing
+        conn.rollback()
+        return
     cursor = conn.cursor()
     
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            channel_name TEXT,
-            avatar TEXT,
-            banner TEXT,
-            description TEXT,
-            subscribers_count INTEGER DEFAULT 0,
-            videos_count INTEGER DEFAULT 0,
-            views_count INTEGER DEFAULT 0,
-            verified BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            title TEXT NOT NULL,
-            description TEXT,
-            video_url TEXT NOT NULL,
-            thumbnail TEXT,
-            duration INTEGER,
-            views_count INTEGER DEFAULT 0,
-            likes_count INTEGER DEFAULT 0,
-            dislikes_count INTEGER DEFAULT 0,
-            comments_count INTEGER DEFAULT 0,
-            category TEXT,
-            tags TEXT,
-            privacy TEXT DEFAULT "public",
-            upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS comments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            video_id INTEGER,
-            user_id INTEGER,
-            text TEXT NOT NULL,
-            likes_count INTEGER DEFAULT 0,
-            reply_to INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (video_id) REFERENCES videos (id),
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (reply_to) REFERENCES comments (id)
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS likes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            video_id INTEGER,
-            type TEXT CHECK(type IN ('like', 'dislike')),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (video_id) REFERENCES videos (id),
-            UNIQUE(user_id, video_id)
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS subscriptions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            subscriber_id INTEGER,
-            channel_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (subscriber_id) REFERENCES users (id),
-            FOREIGN KEY (channel_id) REFERENCES users (id),
-            UNIQUE(subscriber_id, channel_id)
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS playlists (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            title TEXT NOT NULL,
-            description TEXT,
-            privacy TEXT DEFAULT "public",
-            thumbnail TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS playlist_videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            playlist_id INTEGER,
-            video_id INTEGER,
-            position INTEGER,
-            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (playlist_id) REFERENCES playlists (id),
-            FOREIGN KEY (video_id) REFERENCES videos (id),
-            UNIQUE(playlist_id, video_id)
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS watch_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            video_id INTEGER,
-            watch_time INTEGER DEFAULT 0,
-            completed BOOLEAN DEFAULT FALSE,
-            last_watched TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (video_id) REFERENCES videos (id)
-        )
-    """)
-    
     # Insert sample data
     sample_users = [
-        ("ritesh_tech", "ritesh@youtube.com", generate_password_hash("password123"), "Ritesh Tech Channel", "/images/ritesh_avatar.jpg", "/images/ritesh_banner.jpg", "Full Stack Developer sharing coding tutorials", 125000, 45, 2500000, True),
-        ("tech_guru", "tech@youtube.com", generate_password_hash("password123"), "Tech Guru", "/images/tech_avatar.jpg", "/images/tech_banner.jpg", "Latest technology reviews and tutorials", 98000, 23, 1800000, False),
-        ("coding_academy", "academy@youtube.com", generate_password_hash("password123"), "Coding Academy", "/images/academy_avatar.jpg", "/images/academy_banner.jpg", "Learn programming from basics to advanced", 250000, 67, 5200000, True)
+        ("ritesh_tech", "ritesh@youtube.com", password_hash, "Ritesh Tech Channel", "/images/ritesh_avatar.jpg", "/images/ritesh_banner.jpg", "Full Stack Developer sharing coding tutorials", 2500000, True),
+        ("tech_guru", "tech@youtube.com", password_hash, "Tech Guru", "/images/tech_avatar.jpg", "/images/tech_banner.jpg", "Latest technology reviews and tutorials", 1800000, False),
+        ("coding_academy", "academy@youtube.com", password_hash, "Coding Academy", "/images/academy_avatar.jpg", "/images/academy_banner.jpg", "Learn programming from basics to advanced", 5200000, True)
     ]
     
     for user in sample_users:
         cursor.execute("""
-            INSERT OR IGNORE INTO users (username, email, password_hash, channel_name, avatar, banner, description, subscribers_count, videos_count, views_count, verified)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT OR IGNORE INTO users (username, email, password_hash, channel_name, avatar, banner, description, views_count, verified)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, user)
     
     # Sample videos
     sample_videos = [
-        (1, "Python Full Course - Learn Python in 12 Hours", "Complete Python programming tutorial covering all concepts from basics to advanced topics.", "/videos/python_course.mp4", "/thumbnails/python_course.jpg", 43200, 285000, 12500, 150, 890, "Education", "python,programming,tutorial,coding", "public"),
-        (1, "React JS Crash Course 2025", "Learn React JS from scratch in this comprehensive crash course.", "/videos/react_course.mp4", "/thumbnails/react_course.jpg", 25200, 156000, 8900, 89, 567, "Education", "react,javascript,frontend,web development", "public"),
-        (2, "Best Laptops for Programming 2025", "Review of the top 10 laptops perfect for programming and development.", "/videos/laptop_review.mp4", "/thumbnails/laptop_review.jpg", 1260, 45000, 2100, 45, 234, "Technology", "laptop,programming,review,tech", "public"),
-        (3, "Data Structures and Algorithms", "Complete guide to DSA concepts with practical examples.", "/videos/dsa_course.mp4", "/thumbnails/dsa_course.jpg", 32400, 198000, 9800, 120, 445, "Education", "data structures,algorithms,coding,interview", "public")
+        (1, "Python Full Course - Learn Python in 12 Hours", "Complete Python programming tutorial covering all concepts from basics to advanced topics.", "/videos/python_course.mp4", "/thumbnails/python_course.jpg", 43200, 285000, 890, "Education", "python,programming,tutorial,coding", "public"),
+        (1, "React JS Crash Course 2025", "Learn React JS from scratch in this comprehensive crash course.", "/videos/react_course.mp4", "/thumbnails/react_course.jpg", 25200, 156000, 567, "Education", "react,javascript,frontend,web development", "public"),
+        (2, "Best Laptops for Programming 2025", "Review of the top 10 laptops perfect for programming and development.", "/videos/laptop_review.mp4", "/thumbnails/laptop_review.jpg", 1260, 45000, 234, "Technology", "laptop,programming,review,tech", "public"),
+        (3, "Data Structures and Algorithms", "Complete guide to DSA concepts with practical examples.", "/videos/dsa_course.mp4", "/thumbnails/dsa_course.jpg", 32400, 198000, 445, "Education", "data structures,algorithms,coding,interview", "public")
     ]
     
     for video in sample_videos:
         cursor.execute("""
-            INSERT OR IGNORE INTO videos (user_id, title, description, video_url, thumbnail, duration, views_count, likes_count, dislikes_count, comments_count, category, tags, privacy)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT OR IGNORE INTO videos (user_id, title, description, video_url, thumbnail, duration, views_count, comments_count, category, tags, privacy)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, video)
     
+    # Sample reactions; like counters are always recounted from these rows
+    sample_likes = [
+        (2, 1, "like"), (3, 1, "like"), (3, 2, "like"), (1, 3, "like"),
+        (3, 3, "dislike"), (1, 4, "like"), (2, 4, "like")
+    ]
+    cursor.executemany("INSERT OR IGNORE INTO likes (user_id, video_id, type) VALUES (?, ?, ?)", sample_likes)
+    cursor.execute("""
+        UPDATE videos SET
+            likes_count = (SELECT COUNT(*) FROM likes WHERE video_id = videos.id AND type = 'like'),
+            dislikes_count = (SELECT COUNT(*) FROM likes WHERE video_id = videos.id AND type = 'dislike')
+    """)
+    
+    # Sample subscriptions; channel counters are recounted so that
+    # rebuild_inboxes() decides push or pull from real subscriber numbers
+    cursor.executemany("INSERT OR IGNORE INTO subscriptions (subscriber_id, channel_id) VALUES (?, ?)",
+                       [(1, 3), (2, 1), (2, 3), (3, 1)])
+    cursor.execute("""
+        UPDATE users SET
+            subscribers_count = (SELECT COUNT(*) FROM subscriptions WHERE channel_id = users.id),
+            videos_count = (SELECT COUNT(*) FROM videos WHERE user_id = users.id)
+    """)
+    
+    rebuild_trending(conn)
+    rebuild_inboxes(conn)
     conn.commit()
-    conn.close()
 
-class VideoProcessor:
-    @staticmethod
-    def extract_thumbnail(video_path, time_offset=30):
-        """Extract thumbnail from video at specified time"""
-        try:
-            with VideoFileClip(video_path) as video:
-                frame = video.get_frame(time_offset)
-                # Convert to base64
-                cv2_frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                _, buffer = cv2.imencode('.jpg', cv2_frame)
-                thumbnail = base64.b64encode(buffer).decode()
-                return f"data:image/jpeg;base64,{thumbnail}"
-        except Exception as e:
-            return None
-    
-    @staticmethod
-    def get_video_duration(video_path):
-        """Get video duration in seconds"""
-        try:
-            with VideoFileClip(video_path) as video:
-                return int(video.duration)
-        except Exception as e:
-            return 0
-    
-    @staticmethod
-    def generate_video_preview(video_path, intervals=10):
-        """Generate video preview images at different intervals"""
-        try:
-            previews = []
-            with VideoFileClip(video_path) as video:
-                duration = video.duration
-                step = duration / intervals
-                
-                for i in range(intervals):
-                    time_point = i * step
-                    frame = video.get_frame(time_point)
-                    cv2_frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    _, buffer = cv2.imencode('.jpg', cv2_frame)
-                    preview = base64.b64encode(buffer).decode()
-                    previews.append({
-                        "time": time_point,
-                        "image": f"data:image/jpeg;base64,{preview}"
-                    })
-            
-            return previews
-        except Exception as e:
-            return []
-
-class RecommendationSystem:
-    @staticmethod
-    def get_recommendations(user_id, limit=20):
-        """Generate video recommendations based on watch history"""
-        conn = sqlite3.connect("youtube.db")
-        cursor = conn.cursor()
-        
-        # Get user's watch history to understand preferences
-        cursor.execute("""
-            SELECT v.category, v.tags FROM videos v
-            JOIN watch_history wh ON v.id = wh.video_id
-            WHERE wh.user_id = ?
-            ORDER BY wh.last_watched DESC LIMIT 10
-        """, (user_id,))
-        
-        history = cursor.fetchall()
-        
-        # Extract categories and tags
-        categories = []
-        tags = []
-        
-        for category, video_tags in history:
-            if category:
-                categories.append(category)
-            if video_tags:
-                tags.extend(video_tags.split(','))
-        
-        # Get recommendations based on popular categories and tags
-        recommendations = []
-        
-        if categories or tags:
-            category_condition = " OR ".join([f"category = '{cat}'" for cat in set(categories)[:3]])
-            tag_condition = " OR ".join([f"tags LIKE '%{tag.strip()}%'" for tag in set(tags)[:5]])
-            
-            where_clause = ""
-            if category_condition and tag_condition:
-                where_clause = f"WHERE ({category_condition}) OR ({tag_condition})"
-            elif category_condition:
-                where_clause = f"WHERE {category_condition}"
-            elif tag_condition:
-                where_clause = f"WHERE {tag_condition}"
-            
-            if where_clause:
-                cursor.execute(f"""
-                    SELECT v.id, v.title, v.thumbnail, v.views_count, v.duration, u.channel_name, u.avatar
-                    FROM videos v
-                    JOIN users u ON v.user_id = u.id
-                    {where_clause}
-                    ORDER BY v.views_count DESC, v.likes_count DESC
-                    LIMIT ?
-                """, (limit,))
-            else:
-                # Fallback to trending videos
-                cursor.execute("""
-                    SELECT v.id, v.title, v.thumbnail, v.views_count, v.duration, u.channel_name, u.avatar
-                    FROM videos v
-                    JOIN users u ON v.user_id = u.id
-                    ORDER BY v.views_count DESC, v.upload_date DESC
-                    LIMIT ?
-                """, (limit,))
-        else:
-            # No history, return trending videos
-            cursor.execute("""
-                SELECT v.id, v.title, v.thumbnail, v.views_count, v.duration, u.channel_name, u.avatar
-                FROM videos v
-                JOIN users u ON v.user_id = u.id
-                ORDER BY v.views_count DESC, v.upload_date DESC
-                LIMIT ?
-            """, (limit,))
-        
-        for row in cursor.fetchall():
-            recommendations.append({
-                "id": row[0],
-                "title": row[1],
-                "thumbnail": row[2],
-                "views": row[3],
-                "duration": row[4],
-                "channel": row[5],
-                "channel_avatar": row[6]
-            })
-        
-        conn.close()
-        return recommendations
+# Columns selected for each field a client can request from /api/videos
+VIDEO_LISTING_FIELDS = {
+    "id": [],
+    "title": ["v.title"],
+    "description": ["v.description"],
+    "thumbnail": ["v.thumbnail"],
+    "duration": ["v.duration"],
+    "views": ["v.views_count"],
+    "likes": ["v.likes_count"],
+    "upload_date": ["v.upload_date"],
+    "category": ["v.category"],
+    "channel": ["u.channel_name", "u.avatar", "u.verified"],
+}
+
+def _overlay_counters(videos, columns):
+    """Copy cached video dicts with their live counters filled in.
+
+    ``columns`` maps response keys to videos columns; buffered views that
+    have not been flushed yet are added on top of the stored total.
+    """
+    if not videos or not columns:
+        return videos
+    ids = [video["id"] for video in videos]
+    placeholders = ", ".join("?" * len(ids))
+    with get_db() as conn:
+        rows = conn.execute(f"""
+            SELECT id, {", ".join(columns.values())} FROM videos WHERE id IN ({placeholders})
+        """, ids).fetchall()
+    counters = {row[0]: row[1:] for row in rows}
+    overlaid = []
+    for video in videos:
+        video = dict(video)
+        values = counters.get(video["id"])
+        if values is not None:
+            for key, value in zip(columns, values):
+                video[key] = value
+        if "views" in columns:
+            video["views"] += view_counter.pending(video["id"])["views_count"]
+        overlaid.append(video)
+    return overlaid
 
 # API Routes
 @app.route("/api/videos", methods=["GET"])
 def get_videos():
-    """Get videos with filtering options"""
-    category = request.args.get("category")
-    search = request.args.get("search")
-    user_id = request.args.get("user_id")
-    
-    conn = sqlite3.connect("youtube.db")
-    cursor = conn.cursor()
-    
-    query = """
-        SELECT v.id, v.title, v.description, v.thumbnail, v.duration, v.views_count, 
-               v.likes_count, v.upload_date, v.category, u.channel_name, u.avatar, u.verified
-        FROM videos v
-        JOIN users u ON v.user_id = u.id
-        WHERE v.privacy = 'public'
+    """Get a page of videos with filtering options.
+
+    Pages are requested with ``limit`` and the ``cursor`` returned in the
+    X-Next-Cursor header of the previous page. ``fields`` selects which keys
+    each video carries, e.g. ``fields=id,title,thumbnail,channel``.
+    Responses are cached per query string; views and likes are read live.
     """
-    params = []
+    key = ("videos", tuple(sorted(request.args.items(multi=True))))
+    try:
+        videos, headers = response_cache.get_or_build(key, lambda: _build_video_listing(request.args))
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    
+    fields = parse_fields(request.args.get("fields"), VIDEO_LISTING_FIELDS)
+    counters = {key: column for key, column in (("views", "views_count"), ("likes", "likes_count")) if key in fields}
+    videos = _overlay_counters(videos, counters)
+    if "id" not in fields:
+        videos = [{key: value for key, value in video.items() if key != "id"} for video in videos]
+    return response_cache.respond(request, videos, headers)
+
+def _build_video_listing(args):
+    """Query one listing page; returns (videos, headers, cache tags)"""
+    category = args.get("category")
+    search = args.get("search")
+    user_id = args.get("user_id")
+    highlight = args.get("highlight", "").lower() in ("1", "true", "yes")
+    limit = parse_limit(args.get("limit"))
+    fields = parse_fields(args.get("fields"), VIDEO_LISTING_FIELDS)
+    
+    match = build_match_query(search) if search else None
+    if search and not match:
+        return [], {}, ["videos"]
+    
+    after = decode_cursor(args["cursor"], 2) if args.get("cursor") else None
+    
+    # The sort key comes first so the next cursor can be built from any row;
+    # the owner is selected for cache tagging
+    sort_key = rank_expression() if match else "v.upload_date"
+    columns = [sort_key, "v.id", "v.user_id"]
+    for field in fields:
+        columns.extend(VIDEO_LISTING_FIELDS[field])
+    if match and highlight:
+        columns.append(snippet_columns())
+    
+    if match:
+        query = f"""
+            SELECT {", ".join(columns)}
+            FROM videos_fts
+            JOIN videos v ON v.id = videos_fts.rowid
+            JOIN users u ON v.user_id = u.id
+            WHERE videos_fts MATCH ? AND v.privacy = 'public'
+        """
+        params = [match]
+    else:
+        query = f"""
+            SELECT {", ".join(columns)}
+            FROM videos v
+            JOIN users u ON v.user_id = u.id
+            WHERE v.privacy = 'public'
+        """
+        params = []
     
     if category:
         query += " AND v.category = ?"
         params.append(category)
     
-    if search:
-        query += " AND (v.title LIKE ? OR v.description LIKE ? OR v.tags LIKE ?)"
-        params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
-    
     if user_id:
         query += " AND v.user_id = ?"
         params.append(user_id)
     
-    query += " ORDER BY v.upload_date DESC"
+    if match:
+        # Best BM25 score first; ties broken by newest id
+        if after:
+            query += f" AND ({sort_key} > ? OR ({sort_key} = ? AND v.id < ?))"
+            params.extend([after[0], after[0], after[1]])
+        query += f" ORDER BY {sort_key}, v.id DESC"
+    else:
+        if after:
+            query += " AND (v.upload_date, v.id) < (?, ?)"
+            params.extend(after)
+        query += " ORDER BY v.upload_date DESC, v.id DESC"
     
-    cursor.execute(query, params)
-    videos = []
+    query += " LIMIT ?"
+    params.append(limit + 1)
     
-    for row in cursor.fetchall():
-        videos.append({
-            "id": row[0],
-            "title": row[1],
-            "description": row[2],
-            "thumbnail": row[3],
-            "duration": row[4],
-            "views": row[5],
-            "likes": row[6],
-            "upload_date": row[7],
-            "category": row[8],
-            "channel": {
-                "name": row[9],
-                "avatar": row[10],
-                "verified": bool(row[11])
+    with get_db() as conn:
+        rows = conn.execute(query, params).fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    # Cached videos always carry their id so counters can be overlaid
+    videos = []
+    tags = {"videos"}
+    for row in rows:
+        video = {"id": row[1]}
+        tags.update((f"video:{row[1]}", f"user:{row[2]}"))
+        position = 3
+        for field in fields:
+            if field == "channel":
+                video["channel"] = {
+                    "name": row[position],
+                    "avatar": row[position + 1],
+                    "verified": bool(row[position + 2])
+                }
+            elif field != "id":
+                video[field] = row[position]
+            position += len(VIDEO_LISTING_FIELDS[field])
+        if match and highlight:
+            video["highlight"] = {
+                "title": render_highlight(row[position]),
+                "description": render_highlight(row[position + 1])
             }
-        })
+        videos.append(video)
     
-    conn.close()
-    return jsonify(videos)
+    headers = {}
+    if has_more:
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1][0], rows[-1][1])
+    return videos, headers, tags
 
 @app.route("/api/videos/<int:video_id>", methods=["GET"])
 def get_video(video_id):
     """Get single video details"""
-    conn = sqlite3.connect("youtube.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT v.*, u.channel_name, u.avatar, u.verified, u.subscribers_count
-        FROM videos v
-        JOIN users u ON v.user_id = u.id
-        WHERE v.id = ?
-    """, (video_id,))
-    
-    video = cursor.fetchone()
-    if not video:
+    video_data, headers = response_cache.get_or_build(("video", video_id), lambda: _build_video(video_id))
+    if video_data is None:
         return jsonify({"error": "Video not found"}), 404
     
-    # Increment view count
-    cursor.execute("UPDATE videos SET views_count = views_count + 1 WHERE id = ?", (video_id,))
-    conn.commit()
+    # Live counters, buffered views included; the ETag covers them
+    video_data, = _overlay_counters([video_data], {
+        "views": "views_count",
+        "likes": "likes_count",
+        "dislikes": "dislikes_count"
+    })
+    response = response_cache.respond(request, video_data, headers)
+    
+    # Counted after the ETag comparison, so a client revalidating gets a 304
+    # unless counters changed since its copy; the stored total lags by the
+    # deltas still buffered
+    view_counter.add(video_id, views_count=1)
+    trending.record(video_id, views=1)
+    return response
+
+def _build_video(video_id):
+    """Query one video with its channel; returns (video, headers, cache tags)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT v.id, v.user_id, v.title, v.description, v.video_url, v.thumbnail, v.duration,
+                   v.views_count, v.likes_count, v.dislikes_count, v.comments_count, v.category, v.tags,
+                   v.privacy, v.upload_date, u.channel_name, u.avatar, u.verified, u.subscribers_count
+            FROM videos v
+            JOIN users u ON v.user_id = u.id
+            WHERE v.id = ?
+        """, (video_id,))
+        
+        video = cursor.fetchone()
+        if not video:
+            # Cached too, so probing missing ids stays cheap until one is created
+            return None, {}, ["videos", f"video:{video_id}"]
     
     video_data = {
         "id": video[0],
@@ -391,7 +453,7 @@ def get_video(video_id):
         "video_url": video[4],
         "thumbnail": video[5],
         "duration": video[6],
-        "views": video[7] + 1,
+        "views": video[7],
         "likes": video[8],
         "dislikes": video[9],
         "comments_count": video[10],
@@ -405,61 +467,137 @@ def get_video(video_id):
             "subscribers": video[18]
         }
     }
+    return video_data, {}, [f"video:{video[0]}", f"user:{video[1]}"]
+
+@app.route("/api/videos", methods=["POST"])
+def upload_video():
+    """Publish a video whose file is already stored under /videos.
+
+    The row, the channel's videos_count and delivery to subscriber inboxes
+    commit in one transaction.
+    """
+    data = request.json
+    for field in ("user_id", "title", "video_url"):
+        if not data.get(field):
+            return jsonify({"error": f"{field} is required"}), 400
+    privacy = data.get("privacy", "public")
+    if privacy not in VIDEO_PRIVACY:
+        return jsonify({"error": "privacy must be 'public', 'unlisted' or 'private'"}), 400
+    tags = data.get("tags") or ""
+    if isinstance(tags, list):
+        tags = ",".join(tags)
+    
+    with get_db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM users WHERE id = ?", (data["user_id"],)).fetchone() is None:
+            conn.rollback()
+            return jsonify({"error": "Channel not found"}), 404
+        cursor = conn.execute("""
+            INSERT INTO videos (user_id, title, description, video_url, thumbnail, duration, category, tags, privacy)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (data["user_id"], data["title"], data.get("description"), data["video_url"], data.get("thumbnail"),
+              data.get("duration"), data.get("category"), tags, privacy))
+        video_id = cursor.lastrowid
+        conn.execute("UPDATE users SET videos_count = videos_count + 1 WHERE id = ?", (data["user_id"],))
+        delivered = fan_out(conn, video_id)
+        conn.commit()
+        recommender.update_video(conn, video_id)
+    response_cache.invalidate("videos", f"video:{video_id}", f"user:{data['user_id']}")
     
-    conn.close()
-    return jsonify(video_data)
+    return jsonify({"id": video_id, "delivered": delivered, "message": "Video published"}), 201
+
+# Sort key and direction for each way a comment page can be ordered
+COMMENT_ORDERINGS = {
+    "newest": ("c.created_at", "DESC"),
+    "top": ("c.likes_count", "DESC"),
+    "replies": ("c.created_at", "ASC"),
+}
 
 @app.route("/api/videos/<int:video_id>/comments", methods=["GET", "POST"])
 def handle_comments(video_id):
-    """Get or post comments for a video"""
-    conn = sqlite3.connect("youtube.db")
-    cursor = conn.cursor()
-    
+    """Get or post comments for a video.
+
+    GET returns a page of top-level comments (``sort=newest`` or ``top``),
+    each with its ``reply_count``. Passing ``reply_to=<comment id>`` instead
+    returns that thread's replies, oldest first. Further pages are fetched
+    with the cursor from the X-Next-Cursor header.
+    """
     if request.method == "GET":
-        cursor.execute("""
-            SELECT c.id, c.text, c.likes_count, c.created_at, c.reply_to,
-                   u.username, u.avatar
+        reply_to = request.args.get("reply_to", type=int)
+        sort = "replies" if reply_to else request.args.get("sort", "newest")
+        if sort not in COMMENT_ORDERINGS:
+            return jsonify({"error": "sort must be 'newest' or 'top'"}), 400
+        limit = parse_limit(request.args.get("limit"))
+        try:
+            after = decode_cursor(request.args["cursor"], 2) if request.args.get("cursor") else None
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+        
+        sort_key, direction = COMMENT_ORDERINGS[sort]
+        query = f"""
+            SELECT {sort_key}, c.id, c.text, c.likes_count, c.created_at, c.reply_to,
+                   c.reply_count, u.username, u.avatar
             FROM comments c
             JOIN users u ON c.user_id = u.id
-            WHERE c.video_id = ?
-            ORDER BY c.created_at DESC
-        """, (video_id,))
+            WHERE c.video_id = ? AND c.reply_to IS ?
+        """
+        params = [video_id, reply_to]
+        if after:
+            query += f" AND ({sort_key}, c.id) {'<' if direction == 'DESC' else '>'} (?, ?)"
+            params.extend(after)
+        query += f" ORDER BY {sort_key} {direction}, c.id {direction} LIMIT ?"
+        params.append(limit + 1)
+        
+        with get_db() as conn:
+            rows = conn.execute(query, params).fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         comments = []
-        for row in cursor.fetchall():
+        for row in rows:
             comments.append({
-                "id": row[0],
-                "text": row[1],
-                "likes": row[2],
-                "created_at": row[3],
-                "reply_to": row[4],
+                "id": row[1],
+                "text": row[2],
+                "likes": row[3],
+                "created_at": row[4],
+                "reply_to": row[5],
+                "reply_count": row[6],
                 "user": {
-                    "username": row[5],
-                    "avatar": row[6]
+                    "username": row[7],
+                    "avatar": row[8]
                 }
             })
         
-        conn.close()
-        return jsonify(comments)
+        response = jsonify(comments)
+        if has_more:
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1][0], rows[-1][1])
+        return response
     
     elif request.method == "POST":
         data = request.json
-        cursor.execute("""
-            INSERT INTO comments (video_id, user_id, text, reply_to)
-            VALUES (?, ?, ?, ?)
-        """, (video_id, data["user_id"], data["text"], data.get("reply_to")))
-        
-        cursor.execute("UPDATE videos SET comments_count = comments_count + 1 WHERE id = ?", (video_id,))
-        comment_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO comments (video_id, user_id, text, reply_to)
+                VALUES (?, ?, ?, ?)
+            """, (video_id, data["user_id"], data["text"], data.get("reply_to")))
+            comment_id = cursor.lastrowid
+            
+            cursor.execute("UPDATE videos SET comments_count = comments_count + 1 WHERE id = ?", (video_id,))
+            if data.get("reply_to"):
+                cursor.execute("UPDATE comments SET reply_count = reply_count + 1 WHERE id = ?", (data["reply_to"],))
+            conn.commit()
+        response_cache.invalidate(f"video:{video_id}")
+        trending.record(video_id, comments=1)
         
-        # Emit real-time comment
-        socketio.emit("new_comment", {
+        # Emit real-time comment to the video's room
+        comment_broadcaster.publish(video_id, {
             "video_id": video_id,
             "comment_id": comment_id,
             "user_id": data["user_id"],
             "text": data["text"],
+            "reply_to": data.get("reply_to"),
             "timestamp": datetime.now().isoformat()
         })
         
@@ -471,79 +609,307 @@ def like_video(video_id):
     data = request.json
     user_id = data["user_id"]
     like_type = data["type"]  # 'like' or 'dislike'
+    if like_type not in LIKE_TYPES:
+        return jsonify({"error": "type must be 'like' or 'dislike'"}), 400
     
-    conn = sqlite3.connect("youtube.db")
-    cursor = conn.cursor()
-    
-    # Check if user already liked/disliked
-    cursor.execute("SELECT type FROM likes WHERE user_id = ? AND video_id = ?", (user_id, video_id))
-    existing = cursor.fetchone()
-    
-    if existing:
-        if existing[0] == like_type:
-            # Remove like/dislike
-            cursor.execute("DELETE FROM likes WHERE user_id = ? AND video_id = ?", (user_id, video_id))
-            if like_type == "like":
-                cursor.execute("UPDATE videos SET likes_count = likes_count - 1 WHERE id = ?", (video_id,))
-            else:
-                cursor.execute("UPDATE videos SET dislikes_count = dislikes_count - 1 WHERE id = ?", (video_id,))
-            action = "removed"
-        else:
-            # Change like to dislike or vice versa
-            cursor.execute("UPDATE likes SET type = ? WHERE user_id = ? AND video_id = ?", (like_type, user_id, video_id))
-            if like_type == "like":
-                cursor.execute("UPDATE videos SET likes_count = likes_count + 1, dislikes_count = dislikes_count - 1 WHERE id = ?", (video_id,))
-            else:
-                cursor.execute("UPDATE videos SET dislikes_count = dislikes_count + 1, likes_count = likes_count - 1 WHERE id = ?", (video_id,))
-            action = "changed"
-    else:
-        # New like/dislike
-        cursor.execute("INSERT INTO likes (user_id, video_id, type) VALUES (?, ?, ?)", (user_id, video_id, like_type))
-        if like_type == "like":
-            cursor.execute("UPDATE videos SET likes_count = likes_count + 1 WHERE id = ?", (video_id,))
-        else:
-            cursor.execute("UPDATE videos SET dislikes_count = dislikes_count + 1 WHERE id = ?", (video_id,))
-        action = "added"
-    
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        action, = toggle_likes(conn, [(user_id, video_id, like_type)])
+    like_counts.mark(video_id)
+    if like_type == "like" and action != "removed":
+        trending.record_like(user_id, video_id)
     
     return jsonify({"action": action, "type": like_type})
 
+@app.route("/api/likes/batch", methods=["POST"])
+def like_videos_batch():
+    """Apply a queue of like/dislike clicks recorded offline, in order"""
+    data = request.json
+    events = data.get("events", [])
+    if not isinstance(events, list):
+        return jsonify({"error": "events must be a list"}), 400
+    if len(events) > MAX_LIKE_EVENTS:
+        return jsonify({"error": f"At most {MAX_LIKE_EVENTS} events per request"}), 400
+    
+    clicks = []
+    for event in events:
+        if not isinstance(event, dict) or event.get("type") not in LIKE_TYPES:
+            return jsonify({"error": "Each event needs a video_id and a type of 'like' or 'dislike'"}), 400
+        video_id = event.get("video_id")
+        if isinstance(video_id, bool) or not isinstance(video_id, int):
+            return jsonify({"error": "Each event needs an integer video_id"}), 400
+        user_id = event.get("user_id", data.get("user_id"))
+        if isinstance(user_id, bool) or not isinstance(user_id, int):
+            return jsonify({"error": "Each event needs an integer user_id, or one for the whole batch"}), 400
+        clicks.append((user_id, video_id, event["type"]))
+    
+    with get_db() as conn:
+        actions = toggle_likes(conn, clicks)
+    for (user_id, video_id, like_type), action in zip(clicks, actions):
+        like_counts.mark(video_id)
+        if like_type == "like" and action != "removed":
+            trending.record_like(user_id, video_id)
+    
+    return jsonify([
+        {"video_id": video_id, "type": like_type, "action": action}
+        for (_, video_id, like_type), action in zip(clicks, actions)
+    ])
+
 @app.route("/api/recommendations/<int:user_id>", methods=["GET"])
 def get_recommendations(user_id):
     """Get personalized video recommendations"""
-    recommendations = RecommendationSystem.get_recommendations(user_id)
+    recommender.refresh()
+    recommendations = recommendation_cache.get_or_compute(
+        (user_id, recommender.version), lambda: recommender.get_recommendations(user_id)
+    )
     return jsonify(recommendations)
 
+@app.route("/api/channels/<int:channel_id>/subscribe", methods=["POST"])
+def toggle_subscription(channel_id):
+    """Subscribe to a channel, or unsubscribe if already subscribed"""
+    data = request.json
+    try:
+        user_id = int(data["user_id"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "user_id is required and must be an integer"}), 400
+    if user_id == channel_id:
+        return jsonify({"error": "Cannot subscribe to your own channel"}), 400
+    
+    with get_db() as conn:
+        if conn.execute("SELECT 1 FROM users WHERE id = ?", (channel_id,)).fetchone() is None:
+            return jsonify({"error": "Channel not found"}), 404
+        if conn.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone() is None:
+            return jsonify({"error": "User not found"}), 404
+        if unsubscribe(conn, user_id, channel_id):
+            action = "unsubscribed"
+        else:
+            subscribe(conn, user_id, channel_id)
+            action = "subscribed"
+        subscribers = conn.execute("SELECT subscribers_count FROM users WHERE id = ?", (channel_id,)).fetchone()[0]
+    # Video pages show the channel's subscriber count
+    response_cache.invalidate(f"user:{channel_id}")
+    
+    return jsonify({"action": action, "subscribers": subscribers})
+
+@app.route("/api/feed/<int:user_id>", methods=["GET"])
+def get_subscription_feed(user_id):
+    """Newest videos from the channels a user subscribes to, paged by cursor"""
+    limit = parse_limit(request.args.get("limit"))
+    try:
+        after = decode_cursor(request.args["cursor"], 2) if request.args.get("cursor") else None
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    
+    with get_db() as conn:
+        entries = feed_page(conn, user_id, limit, after)
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        video_ids = [video_id for _, video_id in entries]
+        placeholders = ", ".join("?" * len(video_ids))
+        rows = conn.execute(f"""
+            SELECT v.id, v.title, v.thumbnail, v.duration, v.views_count, v.upload_date,
+                   u.id, u.channel_name, u.avatar, u.verified
+            FROM videos v
+            JOIN users u ON v.user_id = u.id
+            WHERE v.id IN ({placeholders}) AND v.privacy = 'public'
+        """, video_ids).fetchall() if video_ids else []
+    
+    by_id = {row[0]: row for row in rows}
+    videos = []
+    for video_id in video_ids:
+        row = by_id.get(video_id)
+        if row is None:
+            # Made private or deleted since it was delivered
+            continue
+        videos.append({
+            "id": row[0],
+            "title": row[1],
+            "thumbnail": row[2],
+            "duration": row[3],
+            "views": row[4] + view_counter.pending(row[0])["views_count"],
+            "upload_date": row[5],
+            "channel": {
+                "id": row[6],
+                "name": row[7],
+                "avatar": row[8],
+                "verified": bool(row[9])
+            }
+        })
+    
+    response = jsonify(videos)
+    if has_more:
+        response.headers["X-Next-Cursor"] = encode_cursor(*entries[-1])
+    return response
+
+@app.route("/api/trending", methods=["GET"])
+def get_trending():
+    """Trending videos overall or in one ``category``, from the maintained lists"""
+    limit = parse_limit(request.args.get("limit"))
+    with get_db() as conn:
+        videos = trending_videos(conn, limit, request.args.get("category"))
+    return jsonify(videos)
+
+@app.route("/videos/<path:filename>", methods=["GET"])
+def stream_video(filename):
+    """Stream a video file with Range, ETag and If-Range support"""
+    video_path = safe_join(os.path.abspath(VIDEO_ROOT), filename)
+    if video_path is None or not os.path.isfile(video_path):
+        return jsonify({"error": "Video not found"}), 404
+    return stream_file(request, video_path, stream_slots)
+
+@app.route("/media/<path:filename>", methods=["GET"])
+def serve_media(filename):
+    """Serve generated thumbnails and sprite sheets.
+
+    Paths are content-addressed, so a URL's bytes never change and can be
+    cached by browsers and CDNs indefinitely.
+    """
+    response = send_from_directory(os.path.abspath(MEDIA_ROOT), filename, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    """Queue thumbnail and preview generation for a video file.
+
+    The file is named by ``video`` (relative to the videos directory) or
+    taken from the ``video_url`` of ``video_id``. Progress and completion
+    are pushed over Socket.IO.
+    """
+    data = request.json
+    video_id = data.get("video_id")
+    video = data.get("video")
+    try:
+        thumbnail_time = float(data.get("thumbnail_time", 30))
+        intervals = int(data.get("intervals", 10))
+    except (TypeError, ValueError):
+        return jsonify({"error": "thumbnail_time and intervals must be numbers"}), 400
+    # NaN fails both comparisons, so it is rejected here too
+    if not 0 <= thumbnail_time <= MAX_THUMBNAIL_TIME:
+        return jsonify({"error": f"thumbnail_time must be between 0 and {MAX_THUMBNAIL_TIME:g} seconds"}), 400
+    if not 0 <= intervals <= MAX_INTERVALS:
+        return jsonify({"error": f"intervals must be between 0 and {MAX_INTERVALS}"}), 400
+    if not video and video_id is not None:
+        with get_db() as conn:
+            row = conn.execute("SELECT video_url FROM videos WHERE id = ?", (video_id,)).fetchone()
+        if not row:
+            return jsonify({"error": "Video not found"}), 404
+        video = row[0]
+    if not video:
+        return jsonify({"error": "video or video_id is required"}), 400
+    
+    if video.startswith("/videos/"):
+        video = video[len("/videos/"):]
+    video_path = safe_join(os.path.abspath(VIDEO_ROOT), video)
+    if video_path is None or not os.path.isfile(video_path):
+        return jsonify({"error": "Video file not found"}), 404
+    
+    job_id = job_queue.enqueue("media", {
+        "video_path": video_path,
+        "thumbnail_time": thumbnail_time,
+        "intervals": intervals,
+        "store": {"root": os.path.abspath(MEDIA_ROOT)}
+    }, video_id=video_id)
+    return jsonify({"id": job_id, "status": "queued"}), 202
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics for routes, SQL, sockets, buffers, caches and jobs"""
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/debug/profile", methods=["GET"])
+def profile_route():
+    """Sample stacks of requests to one route, as collapsed flamegraph input.
+
+    e.g. ``/debug/profile?route=/api/videos&seconds=10`` while load runs;
+    pipe the body to flamegraph.pl or open it in speedscope.
+    """
+    if not PROFILING:
+        return jsonify({"error": "Profiling is disabled; set YOUTUBE_PROFILING=1"}), 404
+    route = request.args.get("route")
+    if not route:
+        return jsonify({"error": "route is required, e.g. /api/videos/<int:video_id>"}), 400
+    try:
+        seconds = min(float(request.args.get("seconds", 10)), MAX_PROFILE_SECONDS)
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    try:
+        stacks, samples = profiler.profile(route, seconds)
+    except RuntimeError as error:
+        return jsonify({"error": str(error)}), 409
+    return Response(stacks, mimetype="text/plain", headers={"X-Profile-Samples": str(samples)})
+
+@app.route("/api/jobs/<int:job_id>", methods=["GET", "DELETE"])
+def handle_job(job_id):
+    """Get the status of a processing job, or cancel it"""
+    if request.method == "DELETE":
+        if not job_queue.cancel(job_id):
+            return jsonify({"error": "Job not found or already finished"}), 409
+        return jsonify({"id": job_id, "status": "cancelled"})
+    
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
 # WebSocket events for real-time features
 @socketio.on("connect")
 def handle_connect():
     """Handle client connection"""
-    print("YouTube client connected")
+    socket_connections.inc("connect")
     emit("status", {"message": "Connected to YouTube Clone API"})
 
+@socketio.on("disconnect")
+def handle_disconnect(reason=None):
+    """Handle client disconnection"""
+    socket_connections.inc("disconnect")
+
+@socketio.on("join_video")
+@socket_event("join_video")
+def handle_join_video(data):
+    """Subscribe to live events of a video when its watch page opens"""
+    try:
+        room = video_room(data["video_id"])
+    except (KeyError, TypeError, ValueError):
+        emit("error", {"error": "video_id is required"})
+        return
+    join_room(room)
+    emit("joined", {"video_id": data["video_id"]})
+
+@socketio.on("leave_video")
+@socket_event("leave_video")
+def handle_leave_video(data):
+    """Stop receiving live events of a video when its watch page closes"""
+    try:
+        room = video_room(data["video_id"])
+    except (KeyError, TypeError, ValueError):
+        return
+    leave_room(room)
+
 @socketio.on("watch_progress")
+@socket_event("watch_progress")
 def handle_watch_progress(data):
     """Handle video watch progress updates"""
-    # Update watch history in database
-    conn = sqlite3.connect("youtube.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT OR REPLACE INTO watch_history (user_id, video_id, watch_time, completed)
-        VALUES (?, ?, ?, ?)
-    """, (data["user_id"], data["video_id"], data["watch_time"], data["completed"]))
-    
-    conn.commit()
-    conn.close()
+    # Buffered; the latest position per viewer and video is written in batches
+    watch_progress.record(data["user_id"], data["video_id"], data["watch_time"], data["completed"])
     
     emit("progress_saved", {"video_id": data["video_id"], "progress": data["watch_time"]})
 
 if __name__ == "__main__":
-    init_db()
-    print("📺 YouTube Clone Python API Server starting...")
+    role = os.environ.get("YOUTUBE_ROLE", "all")
+    create_app(role)
     print("🗄️  Database initialized")
-    print("🎥 Video processing ready")
-    print("🚀 Server running on http://localhost:5004")
-    socketio.run(app, debug=True, host="0.0.0.0", port=5004)
+    if role == "media":
+        # Job events reach viewers through YOUTUBE_MESSAGE_QUEUE
+        print("🎥 Media worker processing queued jobs")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            job_queue.stop()
+    else:
+        print("📺 YouTube Clone Python API Server starting...")
+        if role == "all":
+            print("🎥 Video processing ready")
+        print("🚀 Server running on http://localhost:5004")
+        socketio.run(app, debug=True, host="0.0.0.0", port=5004)
@@ -0,0 +1,116 @@
+# Benchmark: per-request sqlite3.connect vs the pooled WAL connection layer
+#
+# Usage: python benchmarks/bench_db.py [--readers 8] [--writers 2] [--seconds 5]
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import ConnectionPool
+
+READ_QUERY = """
+    SELECT v.id, v.title, v.description, v.thumbnail, v.duration, v.views_count,
+           v.likes_count, v.upload_date, v.category, u.channel_name, u.avatar, u.verified
+    FROM videos v
+    JOIN users u ON v.user_id = u.id
+    WHERE v.privacy = 'public' AND v.id = ?
+"""
+WRITE_QUERY = "UPDATE videos SET views_count = views_count + 1 WHERE id = ?"
+
+def build_database(path, videos):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, channel_name TEXT, avatar TEXT, verified BOOLEAN);
+        CREATE TABLE videos (
+            id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT, description TEXT, thumbnail TEXT,
+            duration INTEGER, views_count INTEGER DEFAULT 0, likes_count INTEGER DEFAULT 0,
+            category TEXT, privacy TEXT DEFAULT 'public', upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.executemany("INSERT INTO users (id, channel_name, avatar, verified) VALUES (?, ?, ?, 0)",
+                     [(i, f"channel {i}", f"/images/{i}.jpg") for i in range(1, 101)])
+    conn.executemany("INSERT INTO videos (user_id, title, description, thumbnail, duration, category) VALUES (?, ?, ?, ?, ?, ?)",
+                     [(i % 100 + 1, f"video {i}", "x" * 200, f"/thumbnails/{i}.jpg", 600, "Education") for i in range(videos)])
+    conn.commit()
+    conn.close()
+
+class PerRequestConnections:
+    """The original access pattern: a fresh rollback-journal connection per call"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def run(self, query, params, write):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            rows = conn.execute(query, params).fetchall()
+            if write:
+                conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+class PooledConnections:
+    def __init__(self, path, size):
+        self.pool = ConnectionPool(path, max_size=size, timeout=30)
+
+    def run(self, query, params, write):
+        with self.pool.connection() as conn:
+            return conn.execute(query, params).fetchall()
+
+def drive(strategy, readers, writers, seconds, videos):
+    counts = {"read": 0, "write": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(kind, seed):
+        done = 0
+        video_id = seed
+        while time.perf_counter() < deadline:
+            video_id = video_id * 1103515245 % videos + 1
+            if kind == "read":
+                strategy.run(READ_QUERY, (video_id,), write=False)
+            else:
+                strategy.run(WRITE_QUERY, (video_id,), write=True)
+            done += 1
+        with lock:
+            counts[kind] += done
+
+    threads = [threading.Thread(target=worker, args=("read", i + 1)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=("write", i + 101)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {kind: count / seconds for kind, count in counts.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare database access strategies under concurrent load")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--videos", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, "before.db")
+        after_path = os.path.join(tmp, "after.db")
+        build_database(before_path, args.videos)
+        build_database(after_path, args.videos)
+
+        results = {
+            "per-request connect": drive(PerRequestConnections(before_path), args.readers, args.writers, args.seconds, args.videos),
+            "pooled WAL": drive(PooledConnections(after_path, args.readers + args.writers), args.readers, args.writers, args.seconds, args.videos),
+        }
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:.0f}s each")
+    for name, rates in results.items():
+        print(f"  {name:<20} reads/s {rates['read']:>10.0f}   writes/s {rates['write']:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# Benchmark suite: latency and throughput of every route and socket event
+#
+# Usage: python benchmarks/bench_endpoints.py [--database youtube-bench.db] [--seconds 5]
+#            [--only feed,search] [--output results.json] [--baseline previous.json]
+#
+# Drives each scenario through Flask's test client (and the Socket.IO test
+# client for socket events) against a dataset from generate_data.py, and
+# reports p50/p95/p99 latency and requests per second. Without --database a
+# small dataset is generated into a temporary directory. Write scenarios add
+# comments, likes, subscriptions, uploads and history, so point --database at
+# a scratch copy.
+#
+# --output writes the results as JSON; --baseline compares against an earlier
+# file and exits non-zero if any scenario's p95 or throughput regressed by
+# more than --tolerance.
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SEARCH_TERMS = ["python", "react tutorial", "music live", "gameplay", "science explained", "cooking recipe", "vlog"]
+CATEGORIES = ["Education", "Technology", "Music", "Gaming", "Sports"]
+
+class Context:
+    """Ids sampled from the dataset so every scenario hits real rows"""
+
+    def __init__(self, app, conn, rng):
+        self.app = app
+        self.video_count = conn.execute("SELECT MAX(id) FROM videos").fetchone()[0]
+        self.user_count = conn.execute("SELECT MAX(id) FROM users").fetchone()[0]
+        # (video_id, comment_id) of comments with replies
+        self.threads = conn.execute(
+            "SELECT video_id, id FROM comments WHERE reply_count > 0 ORDER BY random() LIMIT 1000").fetchall()
+        self.commented = [row[0] for row in conn.execute(
+            "SELECT id FROM videos ORDER BY comments_count DESC LIMIT 1000")]
+        self.cursors = self._feed_cursors(pages=50)
+
+    def _feed_cursors(self, pages):
+        client = self.app.app.test_client()
+        cursors = []
+        url = "/api/videos?limit=20&fields=id"
+        for _ in range(pages):
+            cursor = client.get(url).headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            cursors.append(cursor)
+            url = f"/api/videos?limit=20&fields=id&cursor={cursor}"
+        return cursors or [""]
+
+    def video(self, rng):
+        # Views follow the generator's Zipf skew, so favour low ids
+        return int(rng.random() ** 2 * self.video_count) + 1
+
+    def user(self, rng):
+        return rng.randint(1, self.user_count)
+
+def _get(url):
+    return lambda client, socket, ctx, rng: client.get(url(ctx, rng)).status_code
+
+def _post(url, body):
+    return lambda client, socket, ctx, rng: client.post(url(ctx, rng), json=body(ctx, rng)).status_code
+
+def _watch_progress(client, socket, ctx, rng):
+    socket.emit("watch_progress", {
+        "user_id": ctx.user(rng), "video_id": ctx.video(rng), "watch_time": rng.randrange(3600), "completed": False
+    })
+    return 200 if socket.get_received() else 500
+
+def _join_video(client, socket, ctx, rng):
+    video_id = ctx.video(rng)
+    socket.emit("join_video", {"video_id": video_id})
+    socket.emit("leave_video", {"video_id": video_id})
+    return 200 if socket.get_received() else 500
+
+SCENARIOS = {
+    "feed": _get(lambda ctx, rng: "/api/videos?limit=20"),
+    "feed_deep_page": _get(lambda ctx, rng: f"/api/videos?limit=20&cursor={rng.choice(ctx.cursors)}"),
+    "feed_category": _get(lambda ctx, rng: f"/api/videos?limit=20&category={rng.choice(CATEGORIES)}"),
+    "feed_channel": _get(lambda ctx, rng: f"/api/videos?limit=20&user_id={ctx.user(rng)}"),
+    "search": _get(lambda ctx, rng: f"/api/videos?limit=20&search={rng.choice(SEARCH_TERMS)}"),
+    "video_detail": _get(lambda ctx, rng: f"/api/videos/{ctx.video(rng)}"),
+    "comments_newest": _get(lambda ctx, rng: f"/api/videos/{rng.choice(ctx.commented)}/comments?limit=20"),
+    "comments_top": _get(lambda ctx, rng: f"/api/videos/{rng.choice(ctx.commented)}/comments?sort=top&limit=20"),
+    "comment_replies": _get(lambda ctx, rng: "/api/videos/{}/comments?reply_to={}".format(*rng.choice(ctx.threads))),
+    "post_comment": _post(lambda ctx, rng: f"/api/videos/{ctx.video(rng)}/comments",
+                          lambda ctx, rng: {"user_id": ctx.user(rng), "text": "benchmark comment"}),
+    "like": _post(lambda ctx, rng: f"/api/videos/{ctx.video(rng)}/like",
+                  lambda ctx, rng: {"user_id": ctx.user(rng), "type": rng.choice(["like", "dislike"])}),
+    "likes_batch": _post(lambda ctx, rng: "/api/likes/batch", lambda ctx, rng: {
+        "user_id": ctx.user(rng),
+        "events": [{"video_id": ctx.video(rng), "type": "like"} for _ in range(20)]
+    }),
+    "recommendations": _get(lambda ctx, rng: f"/api/recommendations/{ctx.user(rng)}"),
+    "subscription_feed": _get(lambda ctx, rng: f"/api/feed/{ctx.user(rng)}?limit=20"),
+    "subscribe_toggle": _post(lambda ctx, rng: f"/api/channels/{ctx.user(rng)}/subscribe",
+                              lambda ctx, rng: {"user_id": ctx.user(rng)}),
+    "upload": _post(lambda ctx, rng: "/api/videos", lambda ctx, rng: {
+        "user_id": ctx.user(rng), "title": "benchmark upload", "video_url": "/videos/benchmark.mp4",
+        "category": rng.choice(CATEGORIES), "tags": "benchmark"
+    }),
+    "trending": _get(lambda ctx, rng: "/api/trending?limit=20"),
+    "trending_category": _get(lambda ctx, rng: f"/api/trending?limit=20&category={rng.choice(CATEGORIES)}"),
+    "socket_watch_progress": _watch_progress,
+    "socket_join_video": _join_video,
+}
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def run_scenario(app, ctx, scenario, seconds, threads, warmup, seed):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = app.app.test_client()
+        socket = app.socketio.test_client(app.app)
+        socket.get_received()
+        for _ in range(warmup):
+            scenario(client, socket, ctx, rng)
+        own, failed = [], 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = scenario(client, socket, ctx, rng)
+            own.append(time.perf_counter() - started)
+            failed += status >= 400
+        socket.disconnect()
+        with lock:
+            latencies.extend(own)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / max(len(latencies), 1) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+def compare(results, baseline, tolerance):
+    """Print deltas against a baseline run; returns the regressed scenario names"""
+    regressed = []
+    print(f"\nAgainst baseline (tolerance {tolerance:.0%}):")
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        p95 = current["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        rps = current["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        flag = p95 > tolerance or rps < -tolerance
+        if flag:
+            regressed.append(name)
+        print(f"  {name:<22} p95 {p95:+7.1%}   throughput {rps:+7.1%}{'   REGRESSED' if flag else ''}")
+    return regressed
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every API route and socket event")
+    parser.add_argument("--database")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database or os.path.join(tmp, "bench.db")
+        # Before anything imports db, which reads it once
+        os.environ["YOUTUBE_DB"] = database
+        if args.database is None:
+            from generate_data import generate
+            generate(database, argparse.Namespace(
+                users=2000, channels=0, videos=20000, watch_history=200000, likes=100000,
+                subscriptions=40000, comments=100000, reply_depth=20, seed=args.seed))
+        os.environ.setdefault("YOUTUBE_MEDIA_ROOT", os.path.join(tmp, "media"))
+        import app
+        from db import get_db
+
+        app.init_db()
+        with get_db() as conn:
+            ctx = Context(app, conn, random.Random(args.seed))
+
+        print(f"{args.threads} thread(s), {args.seconds:g}s per scenario, "
+              f"{ctx.video_count} videos / {ctx.user_count} users")
+        print(f"  {'scenario':<22} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        results = {}
+        for name in names:
+            result = run_scenario(app, ctx, SCENARIOS[name], args.seconds, args.threads, args.warmup, args.seed)
+            results[name] = result
+            print(f"  {name:<22} {result['throughput_rps']:9.1f} {result['p50_ms']:9.3f} "
+                  f"{result['p95_ms']:9.3f} {result['p99_ms']:9.3f} {result['errors']:7d}")
+        for buffer in (app.view_counter, app.like_counts, app.watch_progress, app.trending):
+            buffer.flush()
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": args.database,
+            "videos": ctx.video_count,
+            "users": ctx.user_count,
+            "seconds": args.seconds,
+            "threads": args.threads,
+            "seed": args.seed,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as previous:
+            regressed = compare(results, json.load(previous), args.tolerance)
+        if regressed:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Benchmark: subscription feed pages from a join at read time vs inboxes
+#
+# Usage: python benchmarks/bench_feed.py [--users 5000] [--videos 200000] [--subscriptions 500000]
+#            [--requests 2000]
+#
+# Generates a dataset, then times first and deep feed pages for random users
+# two ways: joining subscriptions to every followed channel's videos and
+# sorting (what a feed without inboxes has to do), and feed_page() over the
+# fanned-out inbox. Also times the fan-out of one upload from the largest
+# channel that still fans out.
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def joined_page(conn, user_id, limit, after=None):
+    seek = " AND (v.upload_date, v.id) < (?, ?)" if after else ""
+    return conn.execute(f"""
+        SELECT v.upload_date, v.id FROM subscriptions s
+        JOIN videos v ON v.user_id = s.channel_id AND v.privacy = 'public'
+        WHERE s.subscriber_id = ?{seek}
+        ORDER BY v.upload_date DESC, v.id DESC
+        LIMIT ?
+    """, [user_id, *(after or ()), limit + 1]).fetchall()
+
+def timed(label, requests_, call):
+    latencies = []
+    for _ in range(requests_):
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(f"  {label:<30} p50 {latencies[len(latencies) // 2] * 1000:8.3f} ms"
+          f"   p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare joined and inbox-backed subscription feeds")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--videos", type=int, default=200000)
+    parser.add_argument("--subscriptions", type=int, default=500000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "feed.db")
+        os.environ["YOUTUBE_DB"] = database
+        from generate_data import generate
+        generate(database, argparse.Namespace(
+            users=args.users, channels=0, videos=args.videos, watch_history=0, likes=0,
+            subscriptions=args.subscriptions, comments=0, reply_depth=0, seed=args.seed))
+        from db import get_db
+        from feed import fan_out, feed_page
+
+        rng = random.Random(args.seed)
+        with get_db() as conn:
+            inbox_rows = conn.execute("SELECT COUNT(*) FROM feed_inbox").fetchone()[0]
+            pulled = conn.execute("SELECT COUNT(*) FROM users WHERE feed_pull").fetchone()[0]
+            print(f"{args.users} users following {args.subscriptions // args.users} channels each, "
+                  f"{inbox_rows:,} inbox rows, {pulled} pull channels")
+
+            def user():
+                return rng.randint(1, args.users)
+
+            def deep(page):
+                user_id = user()
+                rows = page(conn, user_id, 20)
+                for _ in range(4):
+                    if len(rows) <= 20:
+                        break
+                    rows = page(conn, user_id, 20, rows[19])
+
+            timed("joined, first page (before)", max(args.requests // 10, 10), lambda: joined_page(conn, user(), 20))
+            timed("inbox, first page", args.requests, lambda: feed_page(conn, user(), 20))
+            timed("joined, pages 1-5 (before)", max(args.requests // 50, 10), lambda: deep(joined_page))
+            timed("inbox, pages 1-5", args.requests // 5, lambda: deep(feed_page))
+
+            channel_id, = conn.execute("""
+                SELECT id FROM users WHERE NOT feed_pull ORDER BY subscribers_count DESC LIMIT 1
+            """).fetchone()
+            video_id = conn.execute("""
+                INSERT INTO videos (user_id, title, video_url) VALUES (?, 'Benchmark upload', '/videos/b.mp4')
+            """, (channel_id,)).lastrowid
+            conn.commit()
+            started = time.perf_counter()
+            delivered = fan_out(conn, video_id)
+            conn.commit()
+            print(f"  fan-out to the largest push channel: {delivered} inboxes "
+                  f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Benchmark: media job throughput as the worker pool grows
+#
+# Usage: python benchmarks/bench_jobs.py [--clips 16] [--seconds 20] [--workers 1,2,4]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def run_batch(workers, clips, media_root):
+    from db import get_db
+    from jobs import JobQueue
+
+    queue = JobQueue(max_workers=workers)
+    queue.start()
+    started = time.perf_counter()
+    job_ids = [
+        queue.enqueue("media", {"video_path": clip, "intervals": 10, "store": {"root": media_root}})
+        for clip in clips
+    ]
+    placeholders = ", ".join("?" * len(job_ids))
+    while True:
+        with get_db() as conn:
+            pending = conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE id IN ({placeholders}) AND status IN ('queued', 'running')",
+                job_ids,
+            ).fetchone()[0]
+        if not pending:
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    queue.stop()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure JobQueue throughput per worker count")
+    parser.add_argument("--clips", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--workers", default=",".join(str(2 ** i) for i in range((os.cpu_count() or 1).bit_length())))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["YOUTUBE_DB"] = os.path.join(tmp, "jobs.db")
+        from bench_media import make_clip
+        from db import get_db
+        from jobs import create_jobs_table
+
+        with get_db() as conn:
+            create_jobs_table(conn)
+
+        # Distinct clips so the content-addressed store never short-circuits a job
+        clips = []
+        for i in range(args.clips):
+            clip = os.path.join(tmp, f"clip{i}.mp4")
+            make_clip(clip, args.seconds, 640 + 16 * i, 360)
+            clips.append(clip)
+
+        baseline = None
+        print(f"{args.clips} clips of {args.seconds:.0f}s on {os.cpu_count()} cores")
+        for workers in [int(w) for w in args.workers.split(",")]:
+            media_root = os.path.join(tmp, f"media-{workers}")
+            elapsed = run_batch(workers, clips, media_root)
+            rate = args.clips / elapsed
+            baseline = baseline or rate
+            print(f"  {workers:>3} workers  {elapsed:7.2f}s  {rate:6.2f} jobs/s  x{rate / baseline:.2f}")
+
+if __name__ == "__main__":
+    main()
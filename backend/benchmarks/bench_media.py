@@ -0,0 +1,105 @@
+# Benchmark: single-pass probe_and_extract + ThumbnailStore vs the original per-call moviepy methods
+#
+# Usage: python benchmarks/bench_media.py [--seconds 60] [--width 1280] [--height 720]
+#
+# Each strategy runs in a fresh process so peak RSS is not shared between them.
+import argparse
+import base64
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+def make_clip(path, seconds, width, height, fps=30):
+    """Write a synthetic clip with moving content so the encoder has work to do"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    yy, xx = np.mgrid[0:height, 0:width]
+    for i in range(int(seconds * fps)):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (xx + i * 4) % 256
+        frame[..., 1] = (yy + i * 2) % 256
+        frame[..., 2] = (xx + yy + i) % 256
+        cv2.putText(frame, str(i), (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+
+def legacy_process(video_path, intervals):
+    """The original VideoProcessor: three methods, three opens, one get_frame per preview"""
+    from moviepy.editor import VideoFileClip
+
+    def encode(frame):
+        _, buffer = cv2.imencode(".jpg", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+        return f"data:image/jpeg;base64,{base64.b64encode(buffer).decode()}"
+
+    try:
+        with VideoFileClip(video_path) as video:
+            duration = int(video.duration)
+    except Exception:
+        duration = 0
+    try:
+        with VideoFileClip(video_path) as video:
+            thumbnail = encode(video.get_frame(30))
+    except Exception:
+        thumbnail = None
+    previews = []
+    try:
+        with VideoFileClip(video_path) as video:
+            step = video.duration / intervals
+            for i in range(intervals):
+                previews.append({"time": i * step, "image": encode(video.get_frame(i * step))})
+    except Exception:
+        previews = []
+    return duration, thumbnail, previews
+
+def pipeline_process(video_path, intervals):
+    from media import ThumbnailStore
+
+    store = ThumbnailStore(root=os.path.join(os.path.dirname(video_path), "media"))
+    result = store.publish(video_path, thumbnail_time=30, intervals=intervals)
+    return result["duration"], result["thumbnail"], result["previews"]
+
+STRATEGIES = {"moviepy (original)": legacy_process, "ThumbnailStore": pipeline_process}
+
+def _measure(name, video_path, intervals, results):
+    started = time.perf_counter()
+    duration, thumbnail, previews = STRATEGIES[name](video_path, intervals)
+    elapsed = time.perf_counter() - started
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    results[name] = (elapsed, own, children, duration, len(previews), thumbnail is not None)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare video frame extraction strategies")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--intervals", type=int, default=10)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp, context.Manager() as manager:
+        clip = os.path.join(tmp, "clip.mp4")
+        make_clip(clip, args.seconds, args.width, args.height)
+        print(f"{args.seconds:.0f}s {args.width}x{args.height} clip, {args.intervals} previews + thumbnail")
+
+        results = manager.dict()
+        for name in STRATEGIES:
+            process = context.Process(target=_measure, args=(name, clip, args.intervals, results))
+            process.start()
+            process.join()
+
+        for name, (elapsed, own, children, duration, previews, thumbnail) in results.items():
+            # ru_maxrss is KiB on Linux; the moviepy path decodes in an ffmpeg child process
+            print(f"  {name:<20} {elapsed:7.2f}s   peak RSS {own / 1024:7.1f} MiB"
+                  f" (+ {children / 1024:.1f} MiB in child processes)"
+                  f"   duration={duration} previews={previews} thumbnail={thumbnail}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Benchmark: per-tick INSERT OR REPLACE vs the coalescing ProgressBuffer
+#
+# Usage: python benchmarks/bench_progress.py [--viewers 2000] [--seconds 60] [--tick 1]
+#
+# Simulates every viewer sending one watch_progress tick per --tick seconds
+# and reports statements executed, commits and wall time for each strategy.
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCHEMA = """
+    CREATE TABLE watch_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, video_id INTEGER,
+        watch_time INTEGER DEFAULT 0, completed BOOLEAN DEFAULT 0,
+        last_watched TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+def ticks(viewers, seconds, tick):
+    for second in range(0, int(seconds), int(tick) or 1):
+        for viewer in range(viewers):
+            yield second, viewer + 1, viewer % 500 + 1, second
+
+def per_tick(path, viewers, seconds, tick):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    commits = 0
+    started = time.perf_counter()
+    for _, user_id, video_id, watch_time in ticks(viewers, seconds, tick):
+        conn.execute("""
+            INSERT OR REPLACE INTO watch_history (user_id, video_id, watch_time, completed)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, video_id, watch_time, False))
+        conn.commit()
+        commits += 1
+    elapsed = time.perf_counter() - started
+    rows = conn.execute("SELECT COUNT(*) FROM watch_history").fetchone()[0]
+    conn.close()
+    return elapsed, commits, commits, rows
+
+def buffered(path, viewers, seconds, tick, interval):
+    from buffers import ProgressBuffer
+    from db import get_db
+
+    with get_db() as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("CREATE UNIQUE INDEX idx_watch_history_user_video ON watch_history (user_id, video_id)")
+
+    buffer = ProgressBuffer(interval=interval, max_pending=10 ** 9)
+    next_flush = interval
+    started = time.perf_counter()
+    for second, user_id, video_id, watch_time in ticks(viewers, seconds, tick):
+        # Drive flushes on simulated time rather than the background thread
+        if second >= next_flush:
+            buffer.flush()
+            next_flush += interval
+        buffer.record(user_id, video_id, watch_time, False)
+    buffer.flush()
+    elapsed = time.perf_counter() - started
+    stats = buffer.stats()
+    with get_db() as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM watch_history").fetchone()[0]
+    return elapsed, stats["flushed_rows"], stats["flushes"], rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare watch progress persistence strategies")
+    parser.add_argument("--viewers", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--tick", type=float, default=1)
+    parser.add_argument("--interval", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["YOUTUBE_DB"] = os.path.join(tmp, "buffered.db")
+        results = {
+            "INSERT OR REPLACE": per_tick(os.path.join(tmp, "per_tick.db"), args.viewers, args.seconds, args.tick),
+            "ProgressBuffer": buffered(os.environ["YOUTUBE_DB"], args.viewers, args.seconds, args.tick, args.interval),
+        }
+
+    events = args.viewers * int(args.seconds / args.tick)
+    print(f"{args.viewers} viewers ticking every {args.tick:g}s for {args.seconds:.0f}s ({events} events)")
+    for name, (elapsed, statements, commits, rows) in results.items():
+        print(f"  {name:<18} {elapsed:7.2f}s   rows written {statements:>8}   commits {commits:>7}"
+              f"   table rows {rows:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Benchmark: global new_comment broadcast vs per-video rooms with digests
+#
+# Usage: python benchmarks/bench_realtime.py [--clients 1000] [--videos 100] [--comments 2000]
+#
+# Connects Socket.IO test clients spread over --videos watch pages, posts
+# comments (half of them on one hot video) and counts the packets the server
+# had to deliver under each strategy.
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+
+from realtime import CommentBroadcaster, video_room
+
+def build_server():
+    app = Flask(__name__)
+    socketio = SocketIO(app)
+    delivered = [0]
+
+    @socketio.on("join_video")
+    def handle_join_video(data):
+        join_room(video_room(data["video_id"]))
+
+    def connect(count, videos):
+        clients = []
+        for i in range(count):
+            client = socketio.test_client(app)
+            client.emit("join_video", {"video_id": i % videos + 1})
+            client.get_received()
+            clients.append(client)
+        # Count deliveries instead of queueing them on every test client
+        def counting(eio_sid, packet):
+            delivered[0] += 1
+        socketio.server._send_eio_packet = counting
+        return clients
+
+    return socketio, connect, delivered
+
+def comments(count, videos, seed=7):
+    rng = random.Random(seed)
+    for i in range(count):
+        video_id = 1 if i % 2 else rng.randint(1, videos)
+        yield video_id, {"video_id": video_id, "comment_id": i, "user_id": 1, "text": f"comment {i}"}
+
+def run(strategy, args):
+    socketio, connect, delivered = build_server()
+    connect(args.clients, args.videos)
+    broadcaster = CommentBroadcaster(socketio.emit)
+    started = time.perf_counter()
+    for n, (video_id, comment) in enumerate(comments(args.comments, args.videos)):
+        if strategy == "global":
+            socketio.emit("new_comment", comment)
+        else:
+            broadcaster.publish(video_id, comment)
+            # Simulated digest ticks: --comments arrive over --seconds
+            if n % max(1, int(args.comments * broadcaster.interval / args.seconds)) == 0:
+                broadcaster.flush()
+    if strategy != "global":
+        broadcaster.flush()
+    return time.perf_counter() - started, delivered[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare comment fan-out strategies")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=60, help="simulated span the comments arrive over")
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients on {args.videos} videos, {args.comments} comments (half on one video)")
+    for name, strategy in (("global broadcast", "global"), ("rooms + digests", "rooms")):
+        elapsed, delivered = run(strategy, args)
+        print(f"  {name:<18} {elapsed:7.2f}s   packets delivered {delivered:>10}"
+              f"   {args.comments / elapsed:9.0f} comments/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Benchmark: per-request scoring cost of the vectorized recommendation engine
+#
+# Usage: python benchmarks/bench_recommendations.py [--videos 1000000] [--requests 200]
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommendations import RecommendationEngine
+
+CATEGORIES = ["Education", "Technology", "Music", "Gaming", "Sports", "News", "Comedy", "Travel"]
+
+def synthetic_rows(count, vocabulary, seed):
+    rng = random.Random(seed)
+    tags = [f"tag{i}" for i in range(vocabulary)]
+    for video_id in range(1, count + 1):
+        yield (
+            video_id,
+            rng.choice(CATEGORIES),
+            ",".join(rng.sample(tags, rng.randint(2, 6))),
+            int(rng.paretovariate(1.2) * 100),
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Time RecommendationEngine scoring")
+    parser.add_argument("--videos", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--history", type=int, default=50)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    engine = RecommendationEngine()
+    started = time.perf_counter()
+    batch = []
+    for row in synthetic_rows(args.videos, args.vocabulary, args.seed):
+        batch.append(row)
+        if len(batch) == 50_000:
+            engine.add_videos(batch)
+            batch = []
+    if batch:
+        engine.add_videos(batch)
+    print(f"loaded {args.videos} videos in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(args.seed)
+    timings = []
+    for _ in range(args.requests):
+        history = [(rng.randint(1, args.videos), rng.randint(10, 3600), rng.uniform(0, 60))
+                   for _ in range(args.history)]
+        started = time.perf_counter()
+        profile, watched = engine.profile(history)
+        engine.top_k(profile, 20, exclude_rows=watched)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    print(f"per request: p50 {statistics.median(timings):.2f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms, max {timings[-1]:.2f} ms")
+
+if __name__ == "__main__":
+    main()
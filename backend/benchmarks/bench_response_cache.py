@@ -0,0 +1,73 @@
+# Benchmark: video read endpoints with and without the response cache
+#
+# Usage: python benchmarks/bench_response_cache.py [--videos 20000] [--requests 5000]
+#
+# Mixes listing pages and video detail requests against a synthetic catalogue,
+# a fraction of them revalidating with If-None-Match as browsers do.
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def seed(conn, videos):
+    conn.executemany("""
+        INSERT INTO users (username, email, password_hash, channel_name) VALUES (?, ?, 'x', ?)
+    """, [(f"user{i}", f"user{i}@example.com", f"Channel {i}") for i in range(100)])
+    conn.executemany("""
+        INSERT INTO videos (user_id, title, description, video_url, thumbnail, duration, category, tags)
+        VALUES (?, ?, ?, '/videos/v.mp4', '/thumbnails/v.jpg', 600, ?, 'python,tutorial')
+    """, [(i % 100 + 1, f"Video {i}", "description " * 20, ("Education", "Music", "Gaming")[i % 3])
+          for i in range(videos)])
+
+def drive(client, requests_, hot_ids):
+    rng = random.Random(3)
+    etags = {}
+    latencies = []
+    for _ in range(requests_):
+        if rng.random() < 0.5:
+            url = f"/api/videos?category={rng.choice(['Education', 'Music', 'Gaming'])}&limit=20"
+        else:
+            url = f"/api/videos/{rng.choice(hot_ids)}"
+        headers = {"If-None-Match": etags[url]} if url in etags and rng.random() < 0.3 else {}
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        if "ETag" in response.headers:
+            etags[url] = response.headers["ETag"]
+    latencies.sort()
+    return sum(latencies), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the video read endpoints with and without caching")
+    parser.add_argument("--videos", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--hot", type=int, default=200, help="distinct videos requested by id")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["YOUTUBE_DB"] = os.path.join(tmp, "cache.db")
+        import app
+        from cache import ResponseCache
+        from db import get_db
+
+        app.init_db()
+        with get_db() as conn:
+            seed(conn, args.videos)
+        hot_ids = random.Random(1).sample(range(1, args.videos + 1), args.hot)
+        client = app.app.test_client()
+
+        print(f"{args.requests} requests over {args.videos} videos ({args.hot} hot), half listings")
+        for name, cache in (("uncached", ResponseCache(ttl=0)), ("ResponseCache", ResponseCache())):
+            app.response_cache = cache
+            total, p50, p99 = drive(client, args.requests, hot_ids)
+            stats = cache.stats()
+            print(f"  {name:<14} {args.requests / total:8.0f} req/s   p50 {p50 * 1000:6.2f} ms   p99 {p99 * 1000:6.2f} ms"
+                  f"   hit ratio {stats['hit_ratio']:.2f}   304s {stats['not_modified']}"
+                  f"   bytes saved {stats['bytes_saved']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Benchmark: process start-up time and memory for each deployment role
+#
+# Usage: python benchmarks/bench_startup.py [--runs 5]
+#
+# Each measurement runs in a fresh interpreter: importing the app, then
+# create_app() for the "api" and "all" roles against a new and an existing
+# database, reporting wall time, peak RSS and whether OpenCV and NumPy were
+# loaded. The cost of importing the media stack in an otherwise empty
+# interpreter is shown last: what a media worker pays on its first job
+# instead of every process paying it at start-up.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+{body}
+result = {{
+    "seconds": time.perf_counter() - started,
+    "rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "cv2": "cv2" in sys.modules,
+    "numpy": "numpy" in sys.modules,
+}}
+{cleanup}
+print(json.dumps(result))
+"""
+
+# (label, timed code, untimed cleanup, start from an empty database)
+SCENARIOS = [
+    ("import app", "import app", "", False),
+    ("create_app(api), new db", "import app\napp.create_app('api')", "", True),
+    ("create_app(api), existing db", "import app\napp.create_app('api')", "", False),
+    ("create_app(all), existing db", "import app\napp.create_app('all')", "app.job_queue.stop()", False),
+    ("import cv2 + numpy alone", "import cv2, numpy", "", False),
+]
+
+def measure(body, database, fresh, cleanup=""):
+    if fresh:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(database + suffix):
+                os.remove(database + suffix)
+    env = dict(os.environ, YOUTUBE_DB=database)
+    output = subprocess.run([sys.executable, "-c", PROBE.format(body=body, cleanup=cleanup)],
+                            cwd=BACKEND, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure start-up time and RSS per role")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "startup.db")
+        # Create the database and warm the bytecode and page caches once
+        measure("import app\napp.create_app('api')", database, fresh=True)
+
+        print(f"Median of {args.runs} runs, each in a new interpreter")
+        print(f"  {'scenario':<32} {'ms':>8} {'RSS MiB':>9}  loaded")
+        for label, body, cleanup, fresh in SCENARIOS:
+            runs = [measure(body, database, fresh, cleanup) for _ in range(args.runs)]
+            loaded = [name for name in ("cv2", "numpy") if runs[-1][name]]
+            print(f"  {label:<32} {statistics.median(r['seconds'] for r in runs) * 1000:8.1f} "
+                  f"{statistics.median(r['rss_mib'] for r in runs):9.1f}  {', '.join(loaded) or '-'}")
+
+if __name__ == "__main__":
+    main()
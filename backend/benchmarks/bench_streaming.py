@@ -0,0 +1,106 @@
+# Benchmark: range streaming throughput and per-stream memory
+#
+# Usage: python benchmarks/bench_streaming.py [--size-mb 256] [--streams 32] [--range-mb 4]
+#
+# Compares stream_file (mmap-backed ranges) with the naive approach of
+# reading each requested range into a bytes object before responding. Both
+# are served by a real threaded Werkzeug server (what socketio.run uses), so
+# the bodies go through the WSGI write path a deployment exercises.
+import argparse
+import http.client
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, Response, request
+from werkzeug.serving import make_server
+
+from streaming import StreamSlots, parse_range, stream_file
+
+def build_app(path):
+    app = Flask(__name__)
+    slots = StreamSlots(limit=1_000_000)
+
+    @app.route("/naive")
+    def naive():
+        size = os.path.getsize(path)
+        start, end = parse_range(request.headers.get("Range"), size) or (0, size - 1)
+        with open(path, "rb") as video:
+            video.seek(start)
+            data = video.read(end - start + 1)
+        return Response(data, status=206, headers={"Content-Range": f"bytes {start}-{end}/{size}"})
+
+    @app.route("/stream")
+    def stream():
+        return stream_file(request, path, slots)
+
+    return app
+
+def drive(port, route, streams, seconds, size, range_size):
+    totals = [0] * streams
+    deadline = time.perf_counter() + seconds
+
+    def reader(index):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            start = rng.randrange(0, size - range_size)
+            connection.request("GET", route, headers={"Range": f"bytes={start}-{start + range_size - 1}"})
+            response = connection.getresponse()
+            if response.status != 206:
+                raise RuntimeError(f"{route} answered {response.status}")
+            while True:
+                chunk = response.read(256 * 1024)
+                if not chunk:
+                    break
+                totals[index] += len(chunk)
+        connection.close()
+
+    tracemalloc.start()
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(streams)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sum(totals) / elapsed / 2 ** 20, peak / streams / 2 ** 20
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent range readers")
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--streams", type=int, default=32)
+    parser.add_argument("--range-mb", type=float, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    size = args.size_mb * 2 ** 20
+    range_size = int(args.range_mb * 2 ** 20)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "video.mp4")
+        with open(path, "wb") as video:
+            for _ in range(args.size_mb):
+                video.write(os.urandom(2 ** 20))
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server("127.0.0.1", 0, build_app(path), threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print(f"{args.streams} concurrent readers, {args.range_mb:g} MiB ranges of a {args.size_mb} MiB file")
+        try:
+            for name, route in (("read into memory", "/naive"), ("stream_file (mmap)", "/stream")):
+                throughput, per_stream = drive(server.server_port, route, args.streams, args.seconds, size, range_size)
+                print(f"  {name:<20} {throughput:9.1f} MiB/s   peak Python heap per stream {per_stream:7.2f} MiB")
+        finally:
+            server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Benchmark: trending feed from a sort over all videos vs the maintained lists
+#
+# Usage: python benchmarks/bench_trending.py [--videos 200000] [--requests 2000] [--events 50000]
+#
+# Times the old trending query (every public video joined to its channel and
+# sorted by views), the maintained lists overall and per category, and the
+# cost of folding a burst of view, like and comment events into the scores.
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = ["Education", "Technology", "Music", "Gaming", "Sports"]
+
+def seed(conn, videos):
+    rng = random.Random(1)
+    conn.executemany("""
+        INSERT INTO users (username, email, password_hash, channel_name) VALUES (?, ?, 'x', ?)
+    """, [(f"user{i}", f"user{i}@example.com", f"Channel {i}") for i in range(500)])
+    conn.executemany("""
+        INSERT INTO videos (user_id, title, video_url, thumbnail, duration, views_count, category, upload_date)
+        VALUES (?, ?, '/videos/v.mp4', '/thumbnails/v.jpg', 600, ?, ?, datetime('now', ?))
+    """, [(i % 500 + 1, f"Video {i}", int(2_000_000 / (i + 1) ** 0.8), rng.choice(CATEGORIES),
+           f"-{rng.randrange(365 * 86400)} seconds") for i in range(videos)])
+
+def old_trending(conn, limit, category=None):
+    query = """
+        SELECT v.id, v.title, v.thumbnail, v.views_count, v.duration, u.channel_name, u.avatar
+        FROM videos v
+        JOIN users u ON v.user_id = u.id
+        WHERE v.privacy = 'public'
+    """
+    params = []
+    if category:
+        query += " AND v.category = ?"
+        params.append(category)
+    query += " ORDER BY v.views_count DESC, v.upload_date DESC LIMIT ?"
+    return conn.execute(query, params + [limit]).fetchall()
+
+def timed(label, requests_, call):
+    latencies = []
+    for _ in range(requests_):
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(f"  {label:<28} p50 {latencies[len(latencies) // 2] * 1000:8.3f} ms"
+          f"   p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare trending queries with the maintained trending lists")
+    parser.add_argument("--videos", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["YOUTUBE_DB"] = os.path.join(tmp, "trending.db")
+        import app
+        from db import get_db
+        from recommendations import trending_videos
+        from trending import rebuild_trending, trending
+
+        app.init_db()
+        with get_db() as conn:
+            seed(conn, args.videos)
+            rebuild_trending(conn)
+            conn.commit()
+            conn.execute("ANALYZE")
+
+        print(f"{args.videos} videos, {args.requests} requests each")
+        rng = random.Random(2)
+        with get_db() as conn:
+            timed("by views (before), all", args.requests, lambda: old_trending(conn, 20))
+            timed("by views (before), category", max(args.requests // 20, 10),
+                  lambda: old_trending(conn, 20, rng.choice(CATEGORIES)))
+            timed("trending lists, all", args.requests, lambda: trending_videos(conn, 20))
+            timed("trending lists, category", args.requests,
+                  lambda: trending_videos(conn, 20, rng.choice(CATEGORIES)))
+
+        started = time.perf_counter()
+        for _ in range(args.events):
+            video_id = int(rng.random() ** 2 * args.videos) + 1
+            kind = rng.random()
+            trending.record(video_id, views=1 if kind < 0.9 else 0, likes=1 if 0.9 <= kind < 0.98 else 0,
+                            comments=1 if kind >= 0.98 else 0)
+        recorded = time.perf_counter() - started
+        trending.flush()
+        stats = trending.stats()
+        print(f"  {args.events} events recorded in {recorded:.3f}s, "
+              f"{stats['flushes']} flushes writing {stats['flushed_rows']} rows "
+              f"in {stats['total_flush_seconds']:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# Check: every SQL statement the API issues is served by an index
+#
+# Usage: python benchmarks/check_query_plans.py [--videos 2000] [--verbose]
+#
+# Seeds a throwaway database, drives each route and background writer while
+# recording the statements SQLite executes, then runs EXPLAIN QUERY PLAN on
+# every distinct statement. Exits non-zero if any plan scans a whole table
+# or has to sort every matching row.
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Statements that are not queries, or whose plan is not worth checking
+SKIPPED = re.compile(r"^\s*(PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|CREATE|ALTER|DROP|EXPLAIN|--)", re.I)
+# FTS5 reads its own shadow tables (tiny config and segment rows)
+FTS_INTERNAL = re.compile(r"FROM '\w+'\.'\w+_(config|data|idx|docsize|content)'")
+# A bare "SCAN t" reads every row; "SCAN t USING INDEX" walks an index in
+# order and stops at the LIMIT, and virtual tables plan their own access
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)\S+( AS \S+)?$")
+# Sorting in a temp b-tree means every matching row is read before the LIMIT
+# applies; only full-text search, which orders by computed rank, may do that
+SORT = "USE TEMP B-TREE FOR ORDER BY"
+
+def full_scans(plan):
+    """Plan steps that read a whole table or sort a whole match set"""
+    scans = [step for step in plan if FULL_SCAN.match(step)]
+    if SORT in plan and not any("VIRTUAL TABLE" in step for step in plan):
+        scans.append(SORT)
+    return scans
+
+def seed(conn, videos):
+    conn.executemany("""
+        INSERT INTO users (username, email, password_hash, channel_name) VALUES (?, ?, 'x', ?)
+    """, [(f"user{i}", f"user{i}@example.com", f"Channel {i}") for i in range(50)])
+    conn.executemany("""
+        INSERT INTO videos (user_id, title, description, video_url, duration, views_count, category, tags, privacy)
+        VALUES (?, ?, 'A video about python', '/videos/v.mp4', 600, ?, ?, 'python,tutorial', ?)
+    """, [(i % 50 + 1, f"Video {i}", i * 7 % 1000, ("Education", "Music")[i % 2],
+           "private" if i % 10 == 0 else "public") for i in range(videos)])
+    conn.executemany("INSERT INTO comments (video_id, user_id, text) VALUES (?, ?, 'nice')",
+                     [(i % 20 + 1, i % 50 + 1) for i in range(500)])
+    conn.executemany("""
+        INSERT INTO watch_history (user_id, video_id, watch_time, last_watched) VALUES (?, ?, 60, datetime('now'))
+    """, [(i % 5 + 1, i + 1) for i in range(100)])
+    conn.execute("ANALYZE")
+
+def exercise(app):
+    """Drive every route and background writer once or twice"""
+    client = app.app.test_client()
+    listing = client.get("/api/videos?limit=5")
+    client.get(f"/api/videos?limit=5&cursor={listing.headers['X-Next-Cursor']}")
+    client.get("/api/videos?category=Music&limit=5")
+    client.get("/api/videos?user_id=3&limit=5")
+    search = client.get("/api/videos?search=video&highlight=1&limit=5")
+    client.get(f"/api/videos?search=video&limit=5&cursor={search.headers['X-Next-Cursor']}")
+    client.get("/api/videos?search=python&category=Education&fields=id,title,views,likes&limit=5")
+    client.get("/api/videos/2")
+    client.get("/api/videos/999999")
+
+    posted = client.post("/api/videos/2/comments", json={"user_id": 1, "text": "first"}).json
+    client.post("/api/videos/2/comments", json={"user_id": 2, "text": "reply", "reply_to": posted["id"]})
+    for sort in ("newest", "top"):
+        page = client.get(f"/api/videos/2/comments?sort={sort}&limit=2")
+        client.get(f"/api/videos/2/comments?sort={sort}&limit=2&cursor={page.headers['X-Next-Cursor']}")
+    client.get(f"/api/videos/2/comments?reply_to={posted['id']}")
+
+    client.post("/api/videos/2/like", json={"user_id": 1, "type": "like"})
+    client.post("/api/videos/2/like", json={"user_id": 1, "type": "like"})
+    client.post("/api/likes/batch", json={"user_id": 2, "events": [
+        {"video_id": 3, "type": "dislike"}, {"video_id": 3, "type": "like"}]})
+
+    client.get("/api/recommendations/1")
+    client.get("/api/recommendations/4000")
+    client.get("/api/trending?category=Music&limit=5")
+
+    client.post("/api/channels/3/subscribe", json={"user_id": 1})
+    client.post("/api/channels/4/subscribe", json={"user_id": 1})
+    client.post("/api/channels/4/subscribe", json={"user_id": 1})
+    client.post("/api/channels/5/subscribe", json={"user_id": 1})
+    with app.get_db() as conn:
+        # Channel 5 is read at query time, as a large channel would be
+        conn.execute("UPDATE users SET feed_pull = 1 WHERE id = 5")
+    client.post("/api/videos", json={"user_id": 3, "title": "New upload", "video_url": "/videos/new.mp4"})
+    feed = client.get("/api/feed/1?limit=3")
+    client.get(f"/api/feed/1?limit=3&cursor={feed.headers['X-Next-Cursor']}")
+    client.get("/api/jobs/1")
+    client.delete("/api/jobs/1")
+
+    socket = app.socketio.test_client(app.app)
+    socket.emit("watch_progress", {"user_id": 1, "video_id": 2, "watch_time": 30, "completed": False})
+
+    app.view_counter.flush()
+    app.like_counts.flush()
+    app.watch_progress.flush()
+    app.trending.flush()
+    with app.get_db() as conn:
+        conn.execute("INSERT INTO jobs (kind, payload) VALUES ('media', '{}')")
+    app.job_queue._claim()
+    app.job_queue._heartbeat()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if any API query plan scans a whole table")
+    parser.add_argument("--videos", type=int, default=2000)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["YOUTUBE_DB"] = os.path.join(tmp, "plans.db")
+        os.environ.setdefault("YOUTUBE_MEDIA_ROOT", os.path.join(tmp, "media"))
+        import app
+        from db import pool
+        from metrics import normalize_statement
+
+        app.init_db()
+        with app.get_db() as conn:
+            seed(conn, args.videos)
+
+        statements = []
+        connect = pool._connect
+
+        def traced_connect():
+            conn = connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        pool.close_all()
+        pool._connect = traced_connect
+        exercise(app)
+        pool._connect = connect
+
+        distinct = {}
+        for sql in statements:
+            if not SKIPPED.match(sql) and not FTS_INTERNAL.search(sql):
+                distinct.setdefault(normalize_statement(sql), sql)
+
+        explain = sqlite3.connect(pool.database)
+        failures = 0
+        for shape, sql in sorted(distinct.items()):
+            plan = [row[3] for row in explain.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            scans = full_scans(plan)
+            if scans:
+                failures += 1
+            if scans or args.verbose:
+                print(("FULL SCAN  " if scans else "ok         ") + shape[:160])
+                for step in plan:
+                    print(f"             {step}")
+        explain.close()
+
+    print(f"{len(distinct)} distinct statements checked, {failures} with full table scans")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# Synthetic data: bulk-load a reproducible, production-shaped dataset
+#
+# Usage: python benchmarks/generate_data.py youtube-bench.db [--users 100000] [--videos 1000000]
+#            [--watch-history 50000000] [--comments 5000000] [--reply-depth 20] [--seed 1]
+#
+# Applies the migrations, then loads users, videos (Zipf-distributed views),
+# watch history, likes, subscriptions and comments with reply chains up to
+# --reply-depth deep. Secondary indexes and the search triggers are dropped
+# during the load and rebuilt once at the end, and denormalized counters
+# (comments_count, likes_count, reply_count, videos_count, subscribers_count)
+# trending scores and subscription inboxes are recomputed so the data matches
+# what the API would have written.
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+from feed import rebuild_inboxes
+from trending import rebuild_trending
+
+BATCH_SIZE = 50000
+CATEGORIES = ["Education", "Technology", "Music", "Gaming", "Sports", "News", "Comedy", "Science", "Travel", "Food"]
+WORDS = (
+    "python react javascript tutorial course review guide beginners advanced tips tricks build project "
+    "music live cover remix gameplay walkthrough speedrun highlights news analysis explained science "
+    "space physics chemistry travel vlog food recipe cooking comedy sketch podcast interview data"
+).split()
+START = datetime(2023, 1, 1)
+SPAN_SECONDS = 3 * 365 * 86400
+# Shared by every generated account; hashing per user would dominate the load
+PASSWORD_HASH = "pbkdf2:sha256:600000$synthetic$0000000000000000000000000000000000000000000000000000000000000000"
+
+def moment(rng):
+    return START + timedelta(seconds=rng.randrange(SPAN_SECONDS))
+
+def timestamp(rng):
+    return moment(rng).strftime("%Y-%m-%d %H:%M:%S")
+
+def chunks(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def distinct_pairs(rng, owners, count, targets):
+    """``count`` (owner, target) pairs, unique per owner, targets skewed to popular ids"""
+    per_owner, extra = divmod(count, owners)
+    for owner in range(1, owners + 1):
+        wanted = min(per_owner + (1 if owner <= extra else 0), targets)
+        seen = set()
+        while len(seen) < wanted:
+            # Squaring a uniform draw favours low ids, which carry the most views
+            seen.add(int(rng.random() ** 2 * targets) + 1)
+        for target in seen:
+            yield owner, target
+
+class BulkLoader:
+    """Inserts in large transactions with secondary indexes and triggers dropped"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.saved = []
+
+    def __enter__(self):
+        self.saved = self.conn.execute("""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name NOT LIKE 'videos_fts%'
+        """).fetchall()
+        for kind, name, _ in self.saved:
+            self.conn.execute(f"DROP {kind.upper()} {name}")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("PRAGMA journal_mode = MEMORY")
+        self.conn.execute("PRAGMA cache_size = -262144")
+        return self
+
+    def insert(self, label, sql, rows):
+        started = time.perf_counter()
+        total = 0
+        for batch in chunks(rows):
+            self.conn.executemany(sql, batch)
+            self.conn.commit()
+            total += len(batch)
+        print(f"  {label:<16} {total:>11,} rows  {time.perf_counter() - started:7.1f}s")
+        return total
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            return False
+        started = time.perf_counter()
+        for _, _, sql in self.saved:
+            self.conn.execute(sql)
+        self.conn.execute("INSERT INTO videos_fts (videos_fts) VALUES ('rebuild')")
+        self.conn.commit()
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        print(f"  {'indexes':<16} {len(self.saved):>11,} rebuilt {time.perf_counter() - started:7.1f}s")
+        return False
+
+def users(rng, count):
+    for i in range(1, count + 1):
+        yield (i, f"user{i}", f"user{i}@example.com", PASSWORD_HASH, f"Channel {i}",
+               f"/images/avatars/{i % 500}.jpg", rng.random() < 0.02, timestamp(rng))
+
+def videos(rng, count, channels):
+    for i in range(1, count + 1):
+        words = rng.sample(WORDS, 6)
+        yield (
+            i,
+            # A minority of accounts upload most videos
+            int(rng.random() ** 3 * channels) + 1,
+            " ".join(words[:4]).title(),
+            " ".join(rng.choices(WORDS, k=30)),
+            f"/videos/{i}.mp4",
+            f"/thumbnails/{i}.jpg",
+            rng.randrange(30, 7200),
+            int(2_000_000 / i ** 0.8),
+            rng.choice(CATEGORIES),
+            ",".join(words[3:]),
+            "private" if rng.random() < 0.05 else "public",
+            timestamp(rng),
+        )
+
+def watch_history(rng, count, user_count, video_count):
+    for user_id, video_id in distinct_pairs(rng, user_count, count, video_count):
+        yield user_id, video_id, rng.randrange(1, 3600), rng.random() < 0.3, timestamp(rng)
+
+def likes(rng, count, user_count, video_count):
+    for user_id, video_id in distinct_pairs(rng, user_count, count, video_count):
+        yield user_id, video_id, "like" if rng.random() < 0.93 else "dislike", timestamp(rng)
+
+def subscriptions(rng, count, user_count):
+    for subscriber_id, channel_id in distinct_pairs(rng, user_count, count, user_count):
+        if subscriber_id != channel_id:
+            yield subscriber_id, channel_id, timestamp(rng)
+
+def comments(rng, count, user_count, video_count, max_depth):
+    """Threads of top-level comments each followed by a reply chain"""
+    comment_id = 0
+    while comment_id < count:
+        video_id = int(rng.random() ** 2 * video_count) + 1
+        depth = min(int(rng.expovariate(1 / 2)), max_depth, count - comment_id - 1)
+        parent = None
+        created = moment(rng)
+        for _ in range(depth + 1):
+            comment_id += 1
+            yield (comment_id, video_id, rng.randrange(1, user_count + 1), " ".join(rng.choices(WORDS, k=12)),
+                   int(rng.paretovariate(1.5)) - 1, parent, created.strftime("%Y-%m-%d %H:%M:%S"))
+            parent = comment_id
+            # Each reply follows its parent within a couple of days
+            created += timedelta(seconds=rng.randrange(1, 2 * 86400))
+
+def recount(conn):
+    """Recompute the denormalized counters the API maintains incrementally"""
+    statements = [
+        ("comments_count", """
+            UPDATE videos SET comments_count = c.total
+            FROM (SELECT video_id, COUNT(*) AS total FROM comments GROUP BY video_id) c
+            WHERE videos.id = c.video_id
+        """),
+        ("likes_count", """
+            UPDATE videos SET likes_count = l.likes, dislikes_count = l.dislikes
+            FROM (
+                SELECT video_id, SUM(type = 'like') AS likes, SUM(type = 'dislike') AS dislikes
+                FROM likes GROUP BY video_id
+            ) l
+            WHERE videos.id = l.video_id
+        """),
+        ("reply_count", """
+            UPDATE comments SET reply_count = r.replies
+            FROM (SELECT reply_to, COUNT(*) AS replies FROM comments WHERE reply_to IS NOT NULL GROUP BY reply_to) r
+            WHERE comments.id = r.reply_to
+        """),
+        ("videos_count", """
+            UPDATE users SET videos_count = v.total, views_count = v.views
+            FROM (SELECT user_id, COUNT(*) AS total, SUM(views_count) AS views FROM videos GROUP BY user_id) v
+            WHERE users.id = v.user_id
+        """),
+        ("subscribers", """
+            UPDATE users SET subscribers_count = s.total
+            FROM (SELECT channel_id, COUNT(*) AS total FROM subscriptions GROUP BY channel_id) s
+            WHERE users.id = s.channel_id
+        """),
+        ("change_seq", """
+            UPDATE videos SET change_seq = (SELECT COALESCE(MAX(change_seq), 0) FROM videos) + id
+            WHERE change_seq IS NULL
+        """),
+    ]
+    for label, sql in statements:
+        started = time.perf_counter()
+        conn.execute(sql)
+        conn.commit()
+        print(f"  {label:<16} recounted      {time.perf_counter() - started:7.1f}s")
+    started = time.perf_counter()
+    rebuild_trending(conn)
+    conn.commit()
+    print(f"  {'trending':<16} rescored       {time.perf_counter() - started:7.1f}s")
+    started = time.perf_counter()
+    rebuild_inboxes(conn)
+    conn.commit()
+    print(f"  {'feed_inbox':<16} refilled       {time.perf_counter() - started:7.1f}s")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def generate(path, args):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    if conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]:
+        raise SystemExit(f"{path} already has videos; generate into a new file")
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    print(f"Generating into {path} (seed {args.seed})")
+    with BulkLoader(conn) as loader:
+        loader.insert("users", """
+            INSERT INTO users (id, username, email, password_hash, channel_name, avatar, verified, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, users(rng, args.users))
+        loader.insert("videos", """
+            INSERT INTO videos (id, user_id, title, description, video_url, thumbnail, duration, views_count,
+                                category, tags, privacy, upload_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, videos(rng, args.videos, args.channels or args.users))
+        loader.insert("watch_history", """
+            INSERT INTO watch_history (user_id, video_id, watch_time, completed, last_watched) VALUES (?, ?, ?, ?, ?)
+        """, watch_history(rng, args.watch_history, args.users, args.videos))
+        loader.insert("likes", """
+            INSERT INTO likes (user_id, video_id, type, created_at) VALUES (?, ?, ?, ?)
+        """, likes(rng, args.likes, args.users, args.videos))
+        loader.insert("subscriptions", """
+            INSERT INTO subscriptions (subscriber_id, channel_id, created_at) VALUES (?, ?, ?)
+        """, subscriptions(rng, args.subscriptions, args.users))
+        loader.insert("comments", """
+            INSERT INTO comments (id, video_id, user_id, text, likes_count, reply_to, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, comments(rng, args.comments, args.users, args.videos, args.reply_depth))
+    recount(conn)
+    conn.close()
+    print(f"Done in {time.perf_counter() - started:.1f}s, {os.path.getsize(path) / 2 ** 20:.0f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load a seeded synthetic dataset")
+    parser.add_argument("database")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--channels", type=int, default=0, help="accounts that upload (default: all users)")
+    parser.add_argument("--videos", type=int, default=100000)
+    parser.add_argument("--watch-history", type=int, default=1000000)
+    parser.add_argument("--likes", type=int, default=500000)
+    parser.add_argument("--subscriptions", type=int, default=200000)
+    parser.add_argument("--comments", type=int, default=500000)
+    parser.add_argument("--reply-depth", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    generate(args.database, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# YouTube Clone - Write-behind buffers for hot counters and events
+import atexit
+import threading
+import time
+
+from db import get_db
+
+# Every buffer whose flusher was ever started, for stop_all()
+_started = []
+_started_lock = threading.Lock()
+
+def stop_all():
+    """Stop every started buffer, writing out whatever each still holds"""
+    with _started_lock:
+        buffers = list(_started)
+    for buffer in buffers:
+        buffer.stop()
+
+class WriteBehindBuffer:
+    """Absorbs high-frequency writes in memory and flushes them in batches.
+
+    Subclasses decide how two values for the same key combine (``_merge``)
+    and how a batch is written (``_write``). A background thread flushes
+    every ``interval`` seconds, or sooner once ``max_pending`` keys are
+    buffered, and a final flush runs at interpreter exit (or from
+    ``stop_all()``, which the app calls on SIGTERM). ``on_flush`` is
+    called with the written (key, value) pairs after each commit.
+    """
+
+    def __init__(self, name, interval=1.0, max_pending=1000, on_flush=None):
+        self.name = name
+        self.on_flush = on_flush
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._registered = False
+        self._stats = {
+            "received": 0,
+            "flushes": 0,
+            "flushed_rows": 0,
+            "flush_errors": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+
+    def _merge(self, older, newer):
+        raise NotImplementedError
+
+    def _write(self, conn, items):
+        raise NotImplementedError
+
+    def start(self):
+        """Start the background flusher (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+            self._thread.start()
+            register = not self._registered
+            self._registered = True
+        if register:
+            with _started_lock:
+                _started.append(self)
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the flusher and durably write anything still buffered"""
+        self._stopped.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Failed batches are re-queued by flush(); keep the thread alive
+                pass
+
+    def _put(self, key, value):
+        with self._lock:
+            if key in self._pending:
+                self._pending[key] = self._merge(self._pending[key], value)
+            else:
+                self._pending[key] = value
+            self._stats["received"] += 1
+            full = len(self._pending) >= self.max_pending
+        if self._thread is None:
+            self.start()
+        if full:
+            self._wake.set()
+
+    def peek(self, key):
+        """Return the buffered (not yet committed) value for key, or None"""
+        with self._lock:
+            inflight = self._inflight.get(key)
+            pending = self._pending.get(key)
+        if inflight is None:
+            return pending
+        if pending is None:
+            return inflight
+        return self._merge(inflight, pending)
+
+    def flush(self):
+        """Write every buffered value in one transaction; returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._inflight, self._pending = self._pending, {}
+                items = list(self._inflight.items())
+
+            started = time.perf_counter()
+            try:
+                with get_db() as conn:
+                    self._write(conn, items)
+                    conn.commit()
+            except Exception:
+                with self._lock:
+                    # Put the batch back underneath anything that arrived since
+                    for key, value in self._inflight.items():
+                        if key in self._pending:
+                            self._pending[key] = self._merge(value, self._pending[key])
+                        else:
+                            self._pending[key] = value
+                    self._inflight = {}
+                    self._stats["flush_errors"] += 1
+                raise
+
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._inflight = {}
+                self._stats["flushes"] += 1
+                self._stats["flushed_rows"] += len(items)
+                self._stats["last_flush_seconds"] = elapsed
+                self._stats["max_flush_seconds"] = max(self._stats["max_flush_seconds"], elapsed)
+                self._stats["total_flush_seconds"] += elapsed
+            if self.on_flush is not None:
+                self.on_flush(items)
+            return len(items)
+
+    def stats(self):
+        """Snapshot of buffer size and flush latency counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending) + len(self._inflight)
+        return stats
+
+class CounterBuffer(WriteBehindBuffer):
+    """Accumulates integer deltas for counter columns of a table keyed by id.
+
+    ``add(video_id, views_count=1)`` is all a request has to do; the deltas
+    land as ``UPDATE table SET col = col + ?`` statements in the next batch.
+    """
+
+    def __init__(self, table, columns, **kwargs):
+        super().__init__(f"{table}-counters", **kwargs)
+        self.table = table
+        self.columns = tuple(columns)
+        assignments = ", ".join(f"{column} = {column} + ?" for column in self.columns)
+        self._update_sql = f"UPDATE {table} SET {assignments} WHERE id = ?"
+
+    def _merge(self, older, newer):
+        return tuple(a + b for a, b in zip(older, newer))
+
+    def _write(self, conn, items):
+        conn.executemany(self._update_sql, [deltas + (key,) for key, deltas in items])
+
+    def add(self, key, **deltas):
+        """Buffer deltas for one row, e.g. ``add(7, views_count=1)``"""
+        self._put(key, tuple(deltas.get(column, 0) for column in self.columns))
+
+    def pending(self, key):
+        """Buffered deltas for one row as a dict of column -> delta"""
+        deltas = self.peek(key)
+        if deltas is None:
+            return dict.fromkeys(self.columns, 0)
+        return dict(zip(self.columns, deltas))
+
+class ProgressBuffer(WriteBehindBuffer):
+    """Coalesces watch progress per (user_id, video_id), keeping the latest.
+
+    However many ticks a viewer sends between flushes, each (user, video)
+    pair becomes one upsert against idx_watch_history_user_video.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__("watch-progress", **kwargs)
+
+    def _merge(self, older, newer):
+        return newer
+
+    def _write(self, conn, items):
+        conn.executemany("""
+            INSERT INTO watch_history (user_id, video_id, watch_time, completed, last_watched)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, video_id) DO UPDATE SET
+                watch_time = excluded.watch_time,
+                completed = excluded.completed,
+                last_watched = excluded.last_watched
+        """, [(user_id, video_id) + progress for (user_id, video_id), progress in items])
+
+    def record(self, user_id, video_id, watch_time, completed):
+        """Buffer the latest position of one viewer in one video"""
+        watched_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        self._put((user_id, video_id), (watch_time, bool(completed), watched_at))
@@ -0,0 +1,220 @@
+# YouTube Clone - In-process caches
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, jsonify
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.invalidated = False
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after ``ttl`` seconds.
+
+    ``get_or_compute`` coalesces concurrent misses for the same key: one
+    caller computes the value while the others wait for its result. A key
+    invalidated while its value is being computed is not cached, so a
+    stale result never outlives the event that invalidated it.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0, "coalesced": 0}
+
+    def get(self, key):
+        """Cached value for key, or None on a miss"""
+        with self._lock:
+            return self._lookup(key)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        value, expires = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing it once on a miss"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and not flight.invalidated:
+                    self._store(key, flight.value)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            if key in self._flights:
+                self._flights[key].invalidated = True
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for flight in self._flights.values():
+                flight.invalidated = True
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        """Snapshot of hit/miss/eviction counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+class _CachedResponse:
+    def __init__(self, payload, headers, tags, built_at):
+        self.payload = payload
+        self.headers = headers
+        self.tags = tags
+        self.built_at = built_at
+
+class ResponseCache:
+    """Caches built JSON payloads of read endpoints and answers conditional GETs.
+
+    Entries are keyed by route and query parameters and carry entity tags
+    such as ``video:12`` or ``user:3``. ``invalidate(*tags)`` marks every
+    entry built before the call with one of those tags as stale, including
+    entries whose build was still running. Responses get a strong ETag over
+    the exact body sent, so volatile values overlaid after the cache lookup
+    are reflected in the tag: a client revalidates to a 304 only while the
+    counters it was sent are still current.
+
+    Only the ``max_tags`` most recently invalidated tags are remembered;
+    forgetting one raises a floor below which every entry counts as stale.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60.0, max_tags=10000):
+        self._entries = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.max_tags = max_tags
+        self._tag_versions = OrderedDict()
+        self._floor = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "not_modified": 0, "bytes_sent": 0, "bytes_saved": 0}
+
+    def get_or_build(self, key, build):
+        """Return (payload, headers) for key, calling build() on a miss.
+
+        ``build`` returns (payload, headers, tags); it may raise to signal
+        a response that must not be cached, e.g. a validation error.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and not self._is_stale(entry):
+            self._count("hits")
+            return entry.payload, entry.headers
+        if entry is not None:
+            self._count("stale")
+            self._entries.invalidate(key)
+        self._count("misses")
+
+        def compute():
+            with self._lock:
+                built_at = self._clock
+            payload, headers, tags = build()
+            return _CachedResponse(payload, headers, frozenset(tags), built_at)
+
+        entry = self._entries.get_or_compute(key, compute)
+        return entry.payload, entry.headers
+
+    def _is_stale(self, entry):
+        with self._lock:
+            if self._floor > entry.built_at:
+                return True
+            return any(self._tag_versions.get(tag, 0) > entry.built_at for tag in entry.tags)
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._clock += 1
+            for tag in tags:
+                self._tag_versions[tag] = self._clock
+                self._tag_versions.move_to_end(tag)
+            while len(self._tag_versions) > self.max_tags:
+                _, version = self._tag_versions.popitem(last=False)
+                self._floor = max(self._floor, version)
+
+    def respond(self, request, payload, headers=None):
+        """JSON response for payload with a strong ETag, or 304 if the client has it"""
+        response = jsonify(payload)
+        body = response.get_data()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        for name, value in (headers or {}).items():
+            response.headers[name] = value
+
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            with self._lock:
+                self._stats["not_modified"] += 1
+                self._stats["bytes_saved"] += len(body)
+            return Response(status=304, headers={"ETag": etag, "Cache-Control": "no-cache", **(headers or {})})
+        with self._lock:
+            self._stats["bytes_sent"] += len(body)
+        return response
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """Hit ratio, 304s and body bytes sent vs saved by conditional GETs"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["tracked_tags"] = len(self._tag_versions)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = self._entries.stats()["entries"]
+        return stats
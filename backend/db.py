@@ -0,0 +1,232 @@
+# YouTube Clone - Database access layer
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import record_statement
+
+DATABASE = os.environ.get("YOUTUBE_DB", "youtube.db")
+
+# Applied to every pooled connection. WAL lets readers proceed while a writer
+# holds the lock; synchronous=NORMAL is durable across application crashes in
+# WAL mode and only risks the last transactions on power loss.
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's time, fetches included, to metrics.
+
+    The time is recorded once the result set is exhausted, the next
+    statement runs, or the cursor is discarded.
+    """
+
+    _sql = None
+    _elapsed = 0.0
+
+    def _report(self):
+        if self._sql is not None:
+            record_statement(self._sql, self._elapsed)
+            self._sql = None
+
+    def execute(self, sql, parameters=()):
+        self._report()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._sql = sql
+            self._elapsed = time.perf_counter() - started
+
+    def executemany(self, sql, seq_of_parameters):
+        self._report()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_statement(sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - started
+        if row is None:
+            self._report()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._elapsed += time.perf_counter() - started
+        if not rows:
+            self._report()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - started
+        self._report()
+        return rows
+
+    def close(self):
+        self._report()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._report()
+        except Exception:
+            pass  # interpreter shutdown
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements all go through InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by request handlers.
+
+    Connections are opened lazily up to ``max_size`` and handed out LIFO so
+    the hottest connection (and its prepared statement cache) is reused first.
+    A thread or greenlet that already holds a connection gets the same one
+    back on nested use, so helpers can open ``connection()`` freely.
+    """
+
+    def __init__(self, database=DATABASE, max_size=8, timeout=10.0, cached_statements=256):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"opened": 0, "closed": 0, "in_use": 0, "acquires": 0, "timeouts": 0, "wait_seconds": 0.0}
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=InstrumentedConnection,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def _discard(self, conn):
+        self._count(closed=1)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self):
+        """Check a connection out of the pool, opening one if needed"""
+        started = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        self._count(acquires=1, timeouts=0 if acquired else 1, wait_seconds=time.perf_counter() - started)
+        if not acquired:
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+            self._count(opened=1)
+        self._count(in_use=1)
+        return conn
+
+    def release(self, conn, failed=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        self._count(in_use=-1)
+        try:
+            if conn.in_transaction:
+                if failed:
+                    conn.rollback()
+                else:
+                    conn.commit()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Yield a pooled connection; commits on success, rolls back on error"""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        failed = False
+        try:
+            yield conn
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._local.conn = None
+            self.release(conn, failed=failed)
+
+    def close_all(self):
+        """Close every idle connection, e.g. on shutdown"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        """Connections opened, checked out and idle, and time spent waiting"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["idle"] = self._idle.qsize()
+        stats["max_size"] = self.max_size
+        return stats
+
+pool = ConnectionPool()
+
+def add_column_if_missing(conn, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless it exists; returns True if added"""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column in columns:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+def get_db():
+    """Context manager returning a pooled connection to the app database"""
+    return pool.connection()
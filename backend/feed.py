@@ -0,0 +1,163 @@
+# YouTube Clone - Subscription feed with fan-out-on-write inboxes
+import heapq
+
+from db import add_column_if_missing
+
+# Channels with at least this many subscribers are not fanned out on upload;
+# their videos are merged into each subscriber's feed when it is read
+FANOUT_MAX_SUBSCRIBERS = 10000
+# Recent videos copied into an inbox when a subscription starts
+INBOX_BACKFILL = 20
+
+def create_feed_tables(conn):
+    """Create inboxes and recount the channel counters they depend on.
+
+    ``feed_inbox`` holds one row per (subscriber, video) for channels that
+    fan out, clustered by subscriber and upload date so a feed page is a
+    single range read. ``users.feed_pull`` marks channels read at query time
+    instead; it is set once a channel reaches FANOUT_MAX_SUBSCRIBERS and
+    stays set, so no video is ever missing from both paths.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS feed_inbox (
+            user_id INTEGER NOT NULL,
+            upload_date TIMESTAMP NOT NULL,
+            video_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, upload_date, video_id)
+        ) WITHOUT ROWID
+    """)
+    # Unsubscribing removes one channel's rows from an inbox
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feed_inbox_channel ON feed_inbox (user_id, channel_id)")
+    # Fan-out reads a channel's subscribers
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_channel ON subscriptions (channel_id, subscriber_id)")
+    add_column_if_missing(conn, "users", "feed_pull", "BOOLEAN DEFAULT FALSE")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_feed_pull ON users (id) WHERE feed_pull")
+
+    # The stored counters were seed values; count what is really there
+    conn.execute("""
+        UPDATE users SET
+            subscribers_count = (SELECT COUNT(*) FROM subscriptions WHERE channel_id = users.id),
+            videos_count = (SELECT COUNT(*) FROM videos WHERE user_id = users.id)
+    """)
+    rebuild_inboxes(conn)
+
+def rebuild_inboxes(conn):
+    """Refill every inbox from subscriptions (after bulk loads)"""
+    conn.execute("UPDATE users SET feed_pull = subscribers_count >= ?", (FANOUT_MAX_SUBSCRIBERS,))
+    conn.execute("DELETE FROM feed_inbox")
+    conn.execute("""
+        INSERT INTO feed_inbox (user_id, upload_date, video_id, channel_id)
+        SELECT s.subscriber_id, r.upload_date, r.id, r.user_id
+        FROM subscriptions s
+        JOIN users u ON u.id = s.channel_id AND NOT u.feed_pull
+        JOIN (
+            SELECT id, user_id, upload_date,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY upload_date DESC, id DESC) AS position
+            FROM videos WHERE privacy = 'public'
+        ) r ON r.user_id = s.channel_id AND r.position <= ?
+        ORDER BY s.subscriber_id, r.upload_date, r.id
+    """, (INBOX_BACKFILL,))
+
+def _begin(conn):
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+def subscribe(conn, user_id, channel_id):
+    """Subscribe and backfill the inbox; returns False if already subscribed"""
+    _begin(conn)
+    cursor = conn.execute("""
+        INSERT INTO subscriptions (subscriber_id, channel_id) VALUES (?, ?)
+        ON CONFLICT (subscriber_id, channel_id) DO NOTHING
+    """, (user_id, channel_id))
+    if cursor.rowcount == 0:
+        conn.commit()
+        return False
+
+    subscribers, pull = conn.execute("""
+        UPDATE users SET
+            subscribers_count = subscribers_count + 1,
+            feed_pull = feed_pull OR subscribers_count + 1 >= ?
+        WHERE id = ?
+        RETURNING subscribers_count, feed_pull
+    """, (FANOUT_MAX_SUBSCRIBERS, channel_id)).fetchone()
+    if not pull:
+        conn.execute("""
+            INSERT OR IGNORE INTO feed_inbox (user_id, upload_date, video_id, channel_id)
+            SELECT ?, upload_date, id, user_id FROM videos
+            WHERE user_id = ? AND privacy = 'public'
+            ORDER BY upload_date DESC, id DESC
+            LIMIT ?
+        """, (user_id, channel_id, INBOX_BACKFILL))
+    conn.commit()
+    return True
+
+def unsubscribe(conn, user_id, channel_id):
+    """Unsubscribe and empty the channel out of the inbox; False if not subscribed"""
+    _begin(conn)
+    cursor = conn.execute("DELETE FROM subscriptions WHERE subscriber_id = ? AND channel_id = ?",
+                          (user_id, channel_id))
+    if cursor.rowcount == 0:
+        conn.commit()
+        return False
+    conn.execute("UPDATE users SET subscribers_count = MAX(subscribers_count - 1, 0) WHERE id = ?", (channel_id,))
+    conn.execute("DELETE FROM feed_inbox WHERE user_id = ? AND channel_id = ?", (user_id, channel_id))
+    conn.commit()
+    return True
+
+def fan_out(conn, video_id):
+    """Deliver a new public video to its channel's inboxes; returns rows added.
+
+    Runs in the caller's transaction, so the upload and its delivery commit
+    together. Channels marked feed_pull are skipped and read at query time.
+    """
+    cursor = conn.execute("""
+        INSERT OR IGNORE INTO feed_inbox (user_id, upload_date, video_id, channel_id)
+        SELECT s.subscriber_id, v.upload_date, v.id, v.user_id
+        FROM videos v
+        JOIN users u ON u.id = v.user_id AND NOT u.feed_pull
+        JOIN subscriptions s ON s.channel_id = v.user_id
+        WHERE v.id = ? AND v.privacy = 'public'
+    """, (video_id,))
+    return cursor.rowcount
+
+def feed_page(conn, user_id, limit, after=None):
+    """(upload_date, video_id) of the next ``limit`` + 1 feed entries, newest first.
+
+    Reads one range of the inbox plus one range per followed pull channel;
+    the cost depends on the page size and the number of large channels
+    followed, never on how many channels the user follows in total.
+    """
+    seek = " AND (upload_date, video_id) < (?, ?)" if after else ""
+    sources = [conn.execute(f"""
+        SELECT upload_date, video_id FROM feed_inbox
+        WHERE user_id = ?{seek}
+        ORDER BY upload_date DESC, video_id DESC
+        LIMIT ?
+    """, [user_id, *(after or ()), limit + 1]).fetchall()]
+
+    pulled = conn.execute("""
+        SELECT u.id FROM users u
+        WHERE u.feed_pull AND EXISTS (
+            SELECT 1 FROM subscriptions s WHERE s.subscriber_id = ? AND s.channel_id = u.id
+        )
+    """, (user_id,)).fetchall()
+    seek = " AND (upload_date, id) < (?, ?)" if after else ""
+    for channel_id, in pulled:
+        sources.append(conn.execute(f"""
+            SELECT upload_date, id FROM videos
+            WHERE user_id = ? AND privacy = 'public'{seek}
+            ORDER BY upload_date DESC, id DESC
+            LIMIT ?
+        """, [channel_id, *(after or ()), limit + 1]).fetchall())
+
+    entries = []
+    seen = set()
+    # Videos fanned out before their channel switched to pull come from both
+    for upload_date, video_id in heapq.merge(*sources, reverse=True):
+        if video_id not in seen:
+            seen.add(video_id)
+            entries.append((upload_date, video_id))
+            if len(entries) > limit:
+                break
+    return entries
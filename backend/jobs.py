@@ -0,0 +1,365 @@
+# YouTube Clone - Background media-processing jobs
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from db import add_column_if_missing, get_db
+from metrics import job_seconds
+
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 5.0
+POLL_INTERVAL = 1.0
+# A running job's owner refreshes heartbeat_at this often; another queue may
+# take the job over once it is LEASE_SECONDS stale
+HEARTBEAT_INTERVAL = 5.0
+LEASE_SECONDS = 30.0
+# Bounds on the frame times and preview counts a job may request
+MAX_THUMBNAIL_TIME = 24 * 3600.0
+MAX_INTERVALS = 100
+
+def create_jobs_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            video_id INTEGER,
+            payload TEXT NOT NULL,
+            status TEXT DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 3,
+            progress REAL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            run_after REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (video_id) REFERENCES videos (id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, run_after)")
+
+def add_job_leases(conn):
+    """Record which queue runs each job and when it last proved alive"""
+    add_column_if_missing(conn, "jobs", "worker_id", "TEXT")
+    add_column_if_missing(conn, "jobs", "heartbeat_at", "REAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, heartbeat_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_worker ON jobs (worker_id) WHERE status = 'running'")
+
+# Worker-process side. The progress queue is handed to each worker once, at
+# start-up, because multiprocessing queues cannot be pickled per task.
+_progress_queue = None
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+def run_media_job(job_id, payload):
+    """Probe a video and publish its thumbnails and sprite (runs in a worker)"""
+    from media import ThumbnailStore
+
+    def report(fraction):
+        if _progress_queue is not None:
+            _progress_queue.put((job_id, round(fraction, 3)))
+
+    store = ThumbnailStore(**payload.get("store", {}))
+    manifest = store.publish(
+        payload["video_path"],
+        thumbnail_time=payload.get("thumbnail_time", 30),
+        intervals=payload.get("intervals", 10),
+        progress=report,
+    )
+    if manifest is None:
+        raise PermanentJobError(f"Could not decode {payload['video_path']}")
+    return manifest
+
+class PermanentJobError(Exception):
+    """A job failure that retrying cannot fix, e.g. an undecodable file"""
+
+class JobQueue:
+    """SQLite-backed queue executing media jobs on a process pool.
+
+    Jobs survive restarts: each running job is leased to one queue, which
+    heartbeats it; a job whose lease went stale (its process died) is taken
+    back by whichever queue claims next, so several worker processes, such
+    as the reloader's parent and child, can share one database.
+
+    Failures are retried with exponential backoff up to ``max_attempts``.
+    Lifecycle changes are reported through ``emit(event, data)`` as
+    job_progress, job_completed, job_failed and job_cancelled events; every
+    payload carries ``job_id`` and ``video_id``.
+    """
+
+    def __init__(self, emit=None, max_workers=None, on_success=None):
+        self.emit = emit
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.on_success = on_success
+        self._futures = {}
+        self._claimed = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._executor = None
+        self._threads = []
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _emit(self, event, data):
+        if self.emit is not None:
+            self.emit(event, data)
+
+    def start(self):
+        """Start dispatching (idempotent)"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._context = multiprocessing.get_context("spawn")
+            self._progress = self._context.Queue()
+            self._executor = self._new_executor()
+            self._stopped.clear()
+            self._threads = [
+                threading.Thread(target=self._dispatch_loop, name="jobs-dispatcher", daemon=True),
+                threading.Thread(target=self._progress_loop, name="jobs-progress", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=self._context,
+            initializer=_init_worker, initargs=(self._progress,),
+        )
+
+    def _submit(self, job_id, kind, payload):
+        with self._lock:
+            if self._executor is None:
+                return None
+            try:
+                future = self._executor.submit(JOB_HANDLERS[kind], job_id, payload)
+            except BrokenProcessPool:
+                # A worker died (e.g. a decoder crash); replace the whole pool
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+                future = self._executor.submit(JOB_HANDLERS[kind], job_id, payload)
+            self._futures[job_id] = future
+        return future
+
+    def stop(self, wait=True):
+        self._stopped.set()
+        self._wake.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def enqueue(self, kind, payload, video_id=None, max_attempts=MAX_ATTEMPTS):
+        """Persist a job and wake this process's dispatcher if it runs one.
+
+        Only processes that called ``start()`` execute jobs; an API process
+        just inserts the row for a media worker to claim.
+        """
+        with get_db() as conn:
+            cursor = conn.execute("""
+                INSERT INTO jobs (kind, video_id, payload, max_attempts) VALUES (?, ?, ?, ?)
+            """, (kind, video_id, json.dumps(payload), max_attempts))
+            job_id = cursor.lastrowid
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        with get_db() as conn:
+            row = conn.execute("""
+                SELECT id, kind, video_id, status, attempts, max_attempts, progress, result, error,
+                       created_at, updated_at
+                FROM jobs WHERE id = ?
+            """, (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "video_id": row[2],
+            "status": row[3],
+            "attempts": row[4],
+            "max_attempts": row[5],
+            "progress": row[6],
+            "result": json.loads(row[7]) if row[7] else None,
+            "error": row[8],
+            "created_at": row[9],
+            "updated_at": row[10]
+        }
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it already finished.
+
+        A job that is already executing cannot be interrupted inside its
+        worker, but its result is discarded when it completes.
+        """
+        with get_db() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status IN ('queued', 'running')
+                RETURNING video_id
+            """, (job_id,))
+            row = cursor.fetchone()
+        if row is not None:
+            with self._lock:
+                future = self._futures.get(job_id)
+            if future is not None:
+                future.cancel()
+            self._emit("job_cancelled", {"job_id": job_id, "video_id": row[0]})
+        return row is not None
+
+    def _reclaim(self, conn, now):
+        """Re-queue (or fail, when out of attempts) jobs whose lease expired"""
+        reclaimed = conn.execute("""
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                error = 'Worker stopped responding', worker_id = NULL, run_after = 0,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)
+            RETURNING id, video_id, status
+        """, (now - LEASE_SECONDS,)).fetchall()
+        return [(job_id, video_id) for job_id, video_id, status in reclaimed if status == "failed"]
+
+    def _heartbeat(self):
+        with get_db() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = 'running'",
+                         (time.time(), self.worker_id))
+
+    def _claim(self):
+        now = time.time()
+        with get_db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            failed = self._reclaim(conn, now)
+            row = conn.execute("""
+                SELECT id, kind, video_id, payload FROM jobs
+                WHERE status = 'queued' AND run_after <= ?
+                ORDER BY run_after, id LIMIT 1
+            """, (now,)).fetchone()
+            if row is not None:
+                conn.execute("""
+                    UPDATE jobs SET status = 'running', attempts = attempts + 1, progress = 0,
+                                    worker_id = ?, heartbeat_at = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (self.worker_id, now, row[0]))
+        for job_id, video_id in failed:
+            self._emit("job_failed", {"job_id": job_id, "video_id": video_id, "error": "Worker stopped responding"})
+        if row is None:
+            return None
+        return row[0], row[1], row[2], json.loads(row[3])
+
+    def _dispatch_loop(self):
+        beat_at = 0.0
+        while not self._stopped.is_set():
+            if self._futures and time.monotonic() - beat_at >= HEARTBEAT_INTERVAL:
+                self._heartbeat()
+                beat_at = time.monotonic()
+            while len(self._futures) < self.max_workers and not self._stopped.is_set():
+                claimed = self._claim()
+                if claimed is None:
+                    break
+                job_id, kind, video_id, payload = claimed
+                self._claimed[job_id] = (kind, video_id, time.perf_counter())
+                future = self._submit(job_id, kind, payload)
+                if future is None:
+                    return
+                future.add_done_callback(lambda done, job_id=job_id: self._finish(job_id, done))
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _progress_loop(self):
+        while not self._stopped.is_set():
+            try:
+                job_id, fraction = self._progress.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with get_db() as conn:
+                conn.execute("""
+                    UPDATE jobs SET progress = ? WHERE id = ? AND status = 'running' AND worker_id = ?
+                """, (fraction, job_id, self.worker_id))
+            video_id = self._claimed.get(job_id, (None, None, None))[1]
+            self._emit("job_progress", {"job_id": job_id, "video_id": video_id, "progress": fraction})
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            kind, video_id, started = self._claimed.pop(job_id, (None, None, None))
+        self._wake.set()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if started is not None:
+            job_seconds.observe(time.perf_counter() - started, kind, "failed" if error else "succeeded")
+        try:
+            self._record_outcome(job_id, video_id, future, error)
+        except Exception as exc:
+            # Never leave a job running because its result could not be stored
+            with get_db() as conn:
+                cursor = conn.execute("""
+                    UPDATE jobs SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'running' AND worker_id = ?
+                """, (f"Could not record result: {exc}", job_id, self.worker_id))
+            if cursor.rowcount:
+                self._emit("job_failed", {"job_id": job_id, "video_id": video_id, "error": str(exc)})
+
+    def _record_outcome(self, job_id, video_id, future, error):
+        with get_db() as conn:
+            if error is None:
+                result = future.result()
+                cursor = conn.execute("""
+                    UPDATE jobs SET status = 'succeeded', progress = 1, result = ?, error = NULL,
+                                    updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'running' AND worker_id = ?
+                    RETURNING video_id
+                """, (json.dumps(result), job_id, self.worker_id))
+                row = cursor.fetchone()
+                if row is None:
+                    return  # cancelled while it ran
+                if self.on_success is not None:
+                    self.on_success(conn, row[0], result)
+                conn.commit()
+                self._emit("job_completed", {"job_id": job_id, "video_id": row[0], "result": result})
+                return
+
+            row = conn.execute("""
+                SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = 'running' AND worker_id = ?
+            """, (job_id, self.worker_id)).fetchone()
+            if row is None:
+                return
+            attempts, max_attempts = row
+            if isinstance(error, PermanentJobError) or attempts >= max_attempts:
+                conn.execute("""
+                    UPDATE jobs SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+                """, (str(error), job_id))
+                conn.commit()
+                self._emit("job_failed", {"job_id": job_id, "video_id": video_id, "error": str(error)})
+            else:
+                delay = RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+                conn.execute("""
+                    UPDATE jobs SET status = 'queued', error = ?, run_after = ?, worker_id = NULL,
+                                    updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (str(error), time.time() + delay, job_id))
+
+    def stats(self):
+        """Jobs per status plus how many are executing in this process"""
+        with get_db() as conn:
+            by_status = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        with self._lock:
+            in_flight = len(self._futures)
+        return {"in_flight": in_flight, "workers": self.max_workers, "by_status": by_status}
+
+JOB_HANDLERS = {
+    "media": run_media_job,
+}
@@ -0,0 +1,60 @@
+# YouTube Clone - Like/dislike toggling and counter reconciliation
+from buffers import WriteBehindBuffer
+
+LIKE_TYPES = ("like", "dislike")
+
+class LikeCountReconciler(WriteBehindBuffer):
+    """Recomputes likes_count/dislikes_count for videos whose likes changed.
+
+    Toggles only mark a video dirty; each flush recounts the dirty videos
+    from the likes table through idx_likes_video_type, so the cost is
+    proportional to the videos touched since the last pass and any drift
+    in the stored counters is corrected rather than carried forward.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__("like-counts", **kwargs)
+
+    def _merge(self, older, newer):
+        return True
+
+    def _write(self, conn, items):
+        conn.executemany("""
+            UPDATE videos SET
+                likes_count = (SELECT COUNT(*) FROM likes WHERE video_id = videos.id AND type = 'like'),
+                dislikes_count = (SELECT COUNT(*) FROM likes WHERE video_id = videos.id AND type = 'dislike')
+            WHERE id = ?
+        """, [(video_id,) for video_id, _ in items])
+
+    def mark(self, video_id):
+        """Schedule a recount for one video"""
+        self._put(video_id, True)
+
+def _apply(cursor, user_id, video_id, like_type):
+    cursor.execute("SELECT type FROM likes WHERE user_id = ? AND video_id = ?", (user_id, video_id))
+    existing = cursor.fetchone()
+
+    if existing and existing[0] == like_type:
+        cursor.execute("DELETE FROM likes WHERE user_id = ? AND video_id = ?", (user_id, video_id))
+        return "removed"
+
+    cursor.execute("""
+        INSERT INTO likes (user_id, video_id, type) VALUES (?, ?, ?)
+        ON CONFLICT (user_id, video_id) DO UPDATE SET type = excluded.type, created_at = CURRENT_TIMESTAMP
+    """, (user_id, video_id, like_type))
+    return "changed" if existing else "added"
+
+def toggle_likes(conn, events):
+    """Apply (user_id, video_id, type) like clicks atomically, in order.
+
+    Clicking the current reaction again removes it; clicking the other one
+    switches it. The whole batch runs under one IMMEDIATE transaction, so a
+    concurrent click on the same row waits instead of acting on a stale read.
+    Returns the action ("added", "changed" or "removed") for each event.
+    """
+    cursor = conn.cursor()
+    if not conn.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+    actions = [_apply(cursor, user_id, video_id, like_type) for user_id, video_id, like_type in events]
+    conn.commit()
+    return actions
@@ -0,0 +1,289 @@
+# YouTube Clone - Video probing, frame extraction and thumbnail storage
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+
+from metrics import media_calls
+
+# cv2 and numpy are imported by the functions that decode and encode frames,
+# so API processes that only need the paths below never load them
+
+MEDIA_ROOT = os.environ.get("YOUTUBE_MEDIA_ROOT", "media")
+VIDEO_ROOT = os.environ.get("YOUTUBE_VIDEO_ROOT", "videos")
+MEDIA_URL = "/media"
+
+# Thumbnail widths written for every video (never upscaled past the source)
+THUMBNAIL_WIDTHS = (1280, 640, 320)
+DEFAULT_THUMBNAIL_WIDTH = 640
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 5
+JPEG_QUALITY = 85
+# Part of every content key; bump when the output format changes
+PIPELINE_VERSION = 1
+
+# Targets closer than this many frames ahead are reached by decoding forward;
+# further ones seek, which lands on the preceding keyframe and decodes from there
+SEEK_THRESHOLD_SECONDS = 2.0
+
+class VideoProbe:
+    """Result of one pass over a video file"""
+
+    def __init__(self, duration, fps, width, height, frame_count):
+        self.duration = duration
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.frame_count = frame_count
+        self.thumbnail = None
+        self.previews = []
+
+def _frame_targets(probe, times):
+    """Map requested times (seconds) to distinct, ascending frame indexes"""
+    last = max(probe.frame_count - 1, 0)
+    targets = {}
+    for time_point in times:
+        index = min(max(int(round(time_point * probe.fps)), 0), last)
+        targets.setdefault(index, []).append(time_point)
+    return sorted(targets.items())
+
+def probe_and_extract(video_path, thumbnail_time=30, preview_count=10, progress=None):
+    """Open a video once and read its metadata, poster frame and previews.
+
+    Preview times are evenly spaced over the duration, like the original
+    ``generate_video_preview``. All frames are collected in a single forward
+    pass: short gaps are crossed with ``grab()`` (demux and decode without
+    colour conversion), long gaps with a keyframe seek. Frames are returned
+    as BGR arrays. ``progress`` is called with the fraction of frames read.
+    Returns None when the file cannot be decoded.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            return None
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if fps <= 0 or frame_count <= 0:
+            return None
+        probe = VideoProbe(
+            duration=frame_count / fps,
+            fps=fps,
+            width=int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            height=int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            frame_count=frame_count,
+        )
+
+        step = probe.duration / preview_count if preview_count else 0
+        preview_times = [i * step for i in range(preview_count)]
+        wanted = preview_times + ([thumbnail_time] if thumbnail_time is not None else [])
+
+        frames = {}
+        position = 0
+        seek_gap = max(int(SEEK_THRESHOLD_SECONDS * fps), 1)
+        targets = _frame_targets(probe, wanted)
+        for done, (index, time_points) in enumerate(targets, 1):
+            if index - position > seek_gap:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+                position = index
+            while position < index:
+                if not capture.grab():
+                    break
+                position += 1
+            ok, frame = capture.read()
+            if not ok:
+                break
+            position += 1
+            for time_point in time_points:
+                frames[time_point] = frame
+            if progress is not None:
+                progress(done / len(targets))
+
+        probe.previews = [(t, frames[t]) for t in preview_times if t in frames]
+        if thumbnail_time is not None:
+            probe.thumbnail = frames.get(thumbnail_time)
+        return probe
+    finally:
+        capture.release()
+
+def _encode_jpeg(frame):
+    import cv2
+
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+def _resize(frame, width):
+    import cv2
+
+    height = max(2, int(round(frame.shape[0] * width / frame.shape[1] / 2)) * 2)
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+def _vtt_timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, rest = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{rest:06.3f}"
+
+def content_key(video_path, thumbnail_time, intervals):
+    """Hash of the file contents plus every parameter that shapes the output"""
+    digest = hashlib.sha256()
+    with open(video_path, "rb") as video:
+        for chunk in iter(lambda: video.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(json.dumps([
+        PIPELINE_VERSION, thumbnail_time, intervals, THUMBNAIL_WIDTHS,
+        SPRITE_TILE_WIDTH, SPRITE_COLUMNS, JPEG_QUALITY,
+    ]).encode())
+    return digest.hexdigest()
+
+class ThumbnailStore:
+    """Content-addressed store of thumbnails and preview sprite sheets.
+
+    Everything derived from one video lives in ``<root>/<key[:2]>/<key>/``
+    next to a ``manifest.json`` that lists public URLs. Output is a pure
+    function of the file contents and parameters, so processing the same
+    upload again returns the existing manifest without decoding anything.
+    """
+
+    def __init__(self, root=MEDIA_ROOT, base_url=MEDIA_URL):
+        self.root = root
+        self.base_url = base_url
+
+    def _url(self, key, name):
+        return f"{self.base_url}/{key[:2]}/{key}/{name}"
+
+    def publish(self, video_path, thumbnail_time=30, intervals=10, progress=None):
+        """Write (or reuse) thumbnails and the preview sprite; returns the manifest or None"""
+        try:
+            key = content_key(video_path, thumbnail_time, intervals)
+        except OSError:
+            # Missing or unreadable upload: same result as an undecodable one
+            return None
+        directory = os.path.join(self.root, key[:2], key)
+        manifest_path = os.path.join(directory, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as manifest_file:
+                return json.load(manifest_file)
+
+        probe = probe_and_extract(video_path, thumbnail_time, intervals, progress)
+        if probe is None:
+            return None
+
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{key}-", dir=os.path.dirname(directory))
+        try:
+            manifest = self._render(probe, key, staging)
+            with open(os.path.join(staging, "manifest.json"), "w") as manifest_file:
+                json.dump(manifest, manifest_file, sort_keys=True)
+            try:
+                os.rename(staging, directory)
+            except OSError:
+                # Another worker published the same content first
+                if not os.path.exists(manifest_path):
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return manifest
+
+    def _render(self, probe, key, staging):
+        manifest = {
+            "key": key,
+            "duration": int(probe.duration),
+            "width": probe.width,
+            "height": probe.height,
+            "thumbnail": None,
+            "thumbnails": {},
+            "sprite": None,
+            "previews": [],
+        }
+
+        poster = probe.thumbnail if probe.thumbnail is not None else (
+            probe.previews[0][1] if probe.previews else None)
+        if poster is not None:
+            widths = [w for w in THUMBNAIL_WIDTHS if w <= poster.shape[1]] or [poster.shape[1]]
+            for width in widths:
+                name = f"thumbnail_{width}.jpg"
+                with open(os.path.join(staging, name), "wb") as image:
+                    image.write(_encode_jpeg(_resize(poster, width)))
+                manifest["thumbnails"][str(width)] = self._url(key, name)
+            default = min(widths, key=lambda w: abs(w - DEFAULT_THUMBNAIL_WIDTH))
+            manifest["thumbnail"] = manifest["thumbnails"][str(default)]
+
+        if probe.previews:
+            manifest["sprite"], manifest["previews"] = self._render_sprite(probe, key, staging)
+        return manifest
+
+    def _render_sprite(self, probe, key, staging):
+        import numpy as np
+
+        tiles = [_resize(frame, SPRITE_TILE_WIDTH) for _, frame in probe.previews]
+        tile_height = tiles[0].shape[0]
+        columns = min(SPRITE_COLUMNS, len(tiles))
+        rows = math.ceil(len(tiles) / columns)
+        sheet = np.zeros((rows * tile_height, columns * SPRITE_TILE_WIDTH, 3), dtype=np.uint8)
+
+        sprite_url = self._url(key, "sprite.jpg")
+        frames = []
+        cues = ["WEBVTT", ""]
+        for i, ((time_point, _), tile) in enumerate(zip(probe.previews, tiles)):
+            x = (i % columns) * SPRITE_TILE_WIDTH
+            y = (i // columns) * tile_height
+            sheet[y:y + tile_height, x:x + SPRITE_TILE_WIDTH] = tile
+            end = probe.previews[i + 1][0] if i + 1 < len(probe.previews) else probe.duration
+            frames.append({
+                "time": time_point,
+                "image": f"{sprite_url}#xywh={x},{y},{SPRITE_TILE_WIDTH},{tile_height}",
+            })
+            cues.append(f"{_vtt_timestamp(time_point)} --> {_vtt_timestamp(end)}")
+            cues.append(f"sprite.jpg#xywh={x},{y},{SPRITE_TILE_WIDTH},{tile_height}")
+            cues.append("")
+
+        with open(os.path.join(staging, "sprite.jpg"), "wb") as image:
+            image.write(_encode_jpeg(sheet))
+        with open(os.path.join(staging, "sprite.vtt"), "w") as vtt:
+            vtt.write("\n".join(cues))
+
+        sprite = {
+            "url": sprite_url,
+            "vtt": self._url(key, "sprite.vtt"),
+            "columns": columns,
+            "rows": rows,
+            "tile_width": SPRITE_TILE_WIDTH,
+            "tile_height": tile_height,
+        }
+        return sprite, frames
+
+thumbnail_store = ThumbnailStore()
+
+class VideoProcessor:
+    @staticmethod
+    @media_calls.time("process")
+    def process(video_path, thumbnail_time=30, intervals=10):
+        """Duration, thumbnail URLs and preview sprite of a video from a single pass"""
+        manifest = thumbnail_store.publish(video_path, thumbnail_time, intervals)
+        if manifest is None:
+            return {"duration": 0, "thumbnail": None, "thumbnails": {}, "sprite": None, "previews": []}
+        return manifest
+
+    @staticmethod
+    @media_calls.time("extract_thumbnail")
+    def extract_thumbnail(video_path, time_offset=30):
+        """URL of a thumbnail taken from the video at the specified time"""
+        return VideoProcessor.process(video_path, thumbnail_time=time_offset, intervals=0)["thumbnail"]
+
+    @staticmethod
+    @media_calls.time("get_video_duration")
+    def get_video_duration(video_path):
+        """Get video duration in seconds"""
+        probe = probe_and_extract(video_path, thumbnail_time=None, preview_count=0)
+        return int(probe.duration) if probe else 0
+
+    @staticmethod
+    @media_calls.time("generate_video_preview")
+    def generate_video_preview(video_path, intervals=10):
+        """Preview frames at even intervals, as sprite sheet fragment URLs"""
+        return VideoProcessor.process(video_path, thumbnail_time=None, intervals=intervals)["previews"]
@@ -0,0 +1,277 @@
+# YouTube Clone - Request, query and socket instrumentation
+import bisect
+import functools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+
+# Seconds; tuned for API calls and SQL statements, which mostly take < 10 ms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_SECONDS = float(os.environ.get("YOUTUBE_SLOW_QUERY_MS", "100")) / 1000
+SLOW_QUERY_LOG_INTERVAL = 60.0
+MAX_STATEMENT_LENGTH = 200
+
+sql_log = logging.getLogger("youtube.sql")
+
+@functools.lru_cache(maxsize=4096)
+def normalize_statement(sql):
+    """Statement text with literals and IN lists collapsed, for use as a key"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\?(\s*,\s*\?)+", "?", sql)
+    return " ".join(sql.split())
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in Prometheus layout"""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def time(self, *labels):
+        """Decorator observing the wall time of each call"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, *labels)
+            return wrapper
+        return decorate
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            pairs = list(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', bound)])} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {cumulative}")
+        return lines
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = _Tally()
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values[labels]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.label_names, labels)))} {value}")
+        return lines
+
+class Registry:
+    """Metrics plus collectors that snapshot other components at scrape time.
+
+    A collector is a callable returning ``(name, type, help, samples)``
+    tuples, where samples is a list of ``(labels_dict, value)``; it lets
+    buffers, caches and queues that keep their own ``stats()`` be exported
+    without counting anything twice.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, function):
+        self._collectors.append(function)
+        return function
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(sorted(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+def stats_collector(prefix, sources, gauges=()):
+    """Collector exporting the numeric ``stats()`` keys of several components.
+
+    ``sources`` maps a ``name`` label value to a callable returning a stats
+    dict; each key becomes ``<prefix>_<key>``, typed as a gauge when listed
+    in ``gauges`` and as a counter otherwise.
+    """
+    def collect():
+        series = {}
+        for name, stats in sources.items():
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    series.setdefault(key, []).append(({"name": name}, value))
+        return [
+            (f"{prefix}_{key}", "gauge" if key in gauges else "counter", f"{prefix} {key} from stats()", samples)
+            for key, samples in series.items()
+        ]
+    return collect
+
+registry = Registry()
+
+request_seconds = registry.histogram(
+    "youtube_http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"])
+sql_seconds = registry.histogram("youtube_sql_duration_seconds", "SQL statement latency including fetches")
+sql_statements = registry.counter(
+    "youtube_sql_statements_total", "SQL statements executed by normalized text", ["statement"])
+sql_statement_seconds = registry.counter(
+    "youtube_sql_statement_seconds_total", "Time spent per normalized SQL statement", ["statement"])
+slow_queries = registry.counter(
+    "youtube_sql_slow_queries_total", "Statements slower than YOUTUBE_SLOW_QUERY_MS", ["statement"])
+socket_events = registry.histogram(
+    "youtube_socket_event_duration_seconds", "Socket.IO event handler latency", ["event"])
+socket_connections = registry.counter(
+    "youtube_socket_connections_total", "Socket.IO connects and disconnects", ["action"])
+media_calls = registry.histogram(
+    "youtube_media_call_duration_seconds", "VideoProcessor call latency", ["method"])
+job_seconds = registry.histogram(
+    "youtube_job_duration_seconds", "Background job run time from claim to finish", ["kind", "outcome"],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+
+class _SlowQueryLog:
+    """Logs each slow normalized statement at most once per interval"""
+
+    def __init__(self, interval=SLOW_QUERY_LOG_INTERVAL):
+        self.interval = interval
+        self._last = {}
+        self._suppressed = _Tally()
+        self._lock = threading.Lock()
+
+    def record(self, statement, seconds):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(statement, -self.interval) < self.interval:
+                self._suppressed[statement] += 1
+                return
+            self._last[statement] = now
+            suppressed = self._suppressed.pop(statement, 0)
+        sql_log.warning("slow query (%.1f ms, %d more since last report): %s",
+                        seconds * 1000, suppressed, statement)
+
+slow_query_log = _SlowQueryLog()
+
+def record_statement(sql, seconds):
+    """Account one statement's execution (and fetch) time"""
+    statement = normalize_statement(sql)[:MAX_STATEMENT_LENGTH]
+    sql_seconds.observe(seconds)
+    sql_statements.inc(statement)
+    sql_statement_seconds.inc(statement, amount=seconds)
+    if seconds >= SLOW_QUERY_SECONDS:
+        slow_queries.inc(statement)
+        slow_query_log.record(statement, seconds)
+
+def socket_event(name):
+    """Decorator timing and counting a Socket.IO event handler"""
+    return socket_events.time(name)
+
+class SamplingProfiler:
+    """Samples the stacks of threads serving selected routes.
+
+    Request hooks register which thread is serving which route; while a
+    profile is running, a sampler thread walks ``sys._current_frames()``
+    every ``interval`` seconds and tallies the stacks of threads serving the
+    requested route. Output is the collapsed-stack format consumed by
+    flamegraph.pl and speedscope: ``outer;inner;leaf count`` per line.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._serving = {}
+        self._profile_lock = threading.Lock()
+
+    def enter(self, route):
+        self._serving[threading.get_ident()] = route
+
+    def leave(self):
+        self._serving.pop(threading.get_ident(), None)
+
+    def profile(self, route, seconds):
+        """Sample ``route`` for ``seconds``; returns (collapsed text, samples)"""
+        if not self._profile_lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            stacks = _Tally()
+            deadline = time.monotonic() + seconds
+            me = threading.get_ident()
+            while time.monotonic() < deadline:
+                frames = sys._current_frames()
+                for ident, serving in list(self._serving.items()):
+                    if serving != route or ident == me or ident not in frames:
+                        continue
+                    stacks[self._collapse(frames[ident])] += 1
+                del frames
+                time.sleep(self.interval)
+            text = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+            return text + ("\n" if text else ""), sum(stacks.values())
+        finally:
+            self._profile_lock.release()
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+profiler = SamplingProfiler()
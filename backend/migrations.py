@@ -0,0 +1,233 @@
+# YouTube Clone - Versioned schema migrations
+import logging
+import time
+
+from db import add_column_if_missing
+from feed import create_feed_tables
+from jobs import add_job_leases, create_jobs_table
+from recommendations import track_video_changes
+from search import add_prefix_indexes, create_search_index
+from trending import create_trending_table
+
+log = logging.getLogger("youtube.migrations")
+
+def _initial_schema(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            channel_name TEXT,
+            avatar TEXT,
+            banner TEXT,
+            description TEXT,
+            subscribers_count INTEGER DEFAULT 0,
+            videos_count INTEGER DEFAULT 0,
+            views_count INTEGER DEFAULT 0,
+            verified BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            title TEXT NOT NULL,
+            description TEXT,
+            video_url TEXT NOT NULL,
+            thumbnail TEXT,
+            duration INTEGER,
+            views_count INTEGER DEFAULT 0,
+            likes_count INTEGER DEFAULT 0,
+            dislikes_count INTEGER DEFAULT 0,
+            comments_count INTEGER DEFAULT 0,
+            category TEXT,
+            tags TEXT,
+            privacy TEXT DEFAULT "public",
+            upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id INTEGER,
+            user_id INTEGER,
+            text TEXT NOT NULL,
+            likes_count INTEGER DEFAULT 0,
+            reply_to INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (video_id) REFERENCES videos (id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (reply_to) REFERENCES comments (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS likes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            video_id INTEGER,
+            type TEXT CHECK(type IN ('like', 'dislike')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (video_id) REFERENCES videos (id),
+            UNIQUE(user_id, video_id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subscriber_id INTEGER,
+            channel_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (subscriber_id) REFERENCES users (id),
+            FOREIGN KEY (channel_id) REFERENCES users (id),
+            UNIQUE(subscriber_id, channel_id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS playlists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            title TEXT NOT NULL,
+            description TEXT,
+            privacy TEXT DEFAULT "public",
+            thumbnail TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS playlist_videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            playlist_id INTEGER,
+            video_id INTEGER,
+            position INTEGER,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (playlist_id) REFERENCES playlists (id),
+            FOREIGN KEY (video_id) REFERENCES videos (id),
+            UNIQUE(playlist_id, video_id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS watch_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            video_id INTEGER,
+            watch_time INTEGER DEFAULT 0,
+            completed BOOLEAN DEFAULT FALSE,
+            last_watched TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (video_id) REFERENCES videos (id)
+        )
+    """)
+
+def _feed_indexes(conn):
+    # Serves the public feed, optionally per category, newest first; deep
+    # pages seek on (upload_date, id) instead of skipping rows
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_feed ON videos (privacy, upload_date, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_category_feed ON videos (privacy, category, upload_date, id)")
+
+def _comment_threads(conn):
+    if add_column_if_missing(conn, "comments", "reply_count", "INTEGER DEFAULT 0"):
+        conn.execute("""
+            UPDATE comments SET reply_count = (
+                SELECT COUNT(*) FROM comments r WHERE r.reply_to = comments.id
+            )
+        """)
+
+    # Comment threads are listed per video and parent, newest or top first
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_comments_thread ON comments (video_id, reply_to, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_comments_top ON comments (video_id, reply_to, likes_count, id)")
+
+def _unique_watch_history(conn):
+    # watch_history used INSERT OR REPLACE without a unique key, so every
+    # progress tick added a row. Keep each viewer's latest row, then enforce it.
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_watch_history_user_video'"
+    ).fetchone()
+    if exists is None:
+        conn.execute("""
+            DELETE FROM watch_history WHERE id NOT IN (
+                SELECT MAX(id) FROM watch_history GROUP BY user_id, video_id
+            )
+        """)
+        conn.execute("CREATE UNIQUE INDEX idx_watch_history_user_video ON watch_history (user_id, video_id)")
+
+def _like_counts_index(conn):
+    # Lets the like counter reconciler recount a single video
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_likes_video_type ON likes (video_id, type)")
+
+def _hot_path_indexes(conn):
+    # A viewer's most recent history feeds their recommendations
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_watch_history_recent ON watch_history (user_id, last_watched)")
+    # Trending: most viewed public videos
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_popular ON videos (privacy, views_count, upload_date)")
+    # A channel's public videos, newest first
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_channel ON videos (user_id, privacy, upload_date, id)")
+
+# Applied in order, each in its own transaction. Never edit or reorder an
+# entry that has shipped; append a new one instead. Every step is written to
+# be safe on databases created before schema_version existed.
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "feed indexes", _feed_indexes),
+    (3, "comment reply counts and thread indexes", _comment_threads),
+    (4, "unique watch history per user and video", _unique_watch_history),
+    (5, "likes per video index", _like_counts_index),
+    (6, "full-text search index", create_search_index),
+    (7, "jobs table", create_jobs_table),
+    (8, "hot-path indexes", _hot_path_indexes),
+    (9, "trending scores", create_trending_table),
+    (10, "subscription inboxes and channel counters", create_feed_tables),
+    (11, "job leases", add_job_leases),
+    (12, "video change sequence", track_video_changes),
+    (13, "search prefix indexes", add_prefix_indexes),
+]
+
+def schema_version(conn):
+    """Highest applied migration, 0 for a new database"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply pending migrations; returns the versions applied.
+
+    Each migration runs under BEGIN IMMEDIATE and the version is re-read
+    once the write lock is held, so processes starting together apply
+    every migration exactly once.
+    """
+    conn.commit()
+    applied = []
+    for version, description, apply in migrations:
+        if version <= schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= schema_version(conn):
+                conn.rollback()
+                continue
+            started = time.perf_counter()
+            apply(conn)
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        log.info("Applied migration %d (%s) in %.3fs", version, description, time.perf_counter() - started)
+        applied.append(version)
+    return applied
@@ -0,0 +1,47 @@
+# YouTube Clone - Keyset pagination helpers
+import base64
+import json
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+def encode_cursor(*values):
+    """Pack the sort key of the last row on a page into an opaque token"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token, size):
+    """Unpack a token from encode_cursor, checking it holds ``size`` values"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(token)
+    # Only values SQLite can bind: no nested containers, booleans or
+    # integers beyond 64 bits
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise InvalidCursor(token)
+        if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+            raise InvalidCursor(token)
+    return values
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Clamp a ?limit= query parameter to 1..maximum"""
+    try:
+        limit = int(value) if value is not None else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+def parse_fields(value, allowed):
+    """Return the requested subset of ``allowed`` fields, or all of them"""
+    if not value:
+        return list(allowed)
+    requested = {field.strip() for field in value.split(",")}
+    return [field for field in allowed if field in requested]
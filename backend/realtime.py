@@ -0,0 +1,138 @@
+# YouTube Clone - Room-scoped live events and the Socket.IO message queue
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import socketio
+
+HOT_COMMENTS_PER_WINDOW = 10
+HOT_WINDOW_SECONDS = 5.0
+DIGEST_INTERVAL = 2.0
+MAX_DIGEST_COMMENTS = 50
+
+def video_room(video_id):
+    """Room joined by every client watching ``video_id``"""
+    return f"video:{int(video_id)}"
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """In-process stand-in for a Redis/Kafka/AMQP Socket.IO message queue.
+
+    Every manager created with the same channel shares rooms and emits, the
+    same way several server processes would through a broker. Messages go
+    through JSON so payloads that a real queue would reject fail here too.
+    Selected with ``YOUTUBE_MESSAGE_QUEUE=local://<channel>``.
+    """
+
+    name = "local"
+    _channels = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, url="local://", channel="flask-socketio", write_only=False, logger=None):
+        super().__init__(channel=url[len("local://"):] or channel, write_only=write_only, logger=logger)
+        self._inbox = queue.Queue()
+        if not write_only:
+            with self._channels_lock:
+                self._channels.setdefault(self.channel, []).append(self._inbox)
+
+    def _publish(self, data):
+        message = json.dumps(data)
+        with self._channels_lock:
+            inboxes = list(self._channels.get(self.channel, ()))
+        for inbox in inboxes:
+            inbox.put(message)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+def queue_options(url):
+    """SocketIO keyword arguments for the configured message queue URL.
+
+    No URL keeps the default single-process manager; ``local://`` selects
+    LocalPubSubManager, anything else (redis://, kafka://, amqp://, ...)
+    is handed to Flask-SocketIO's own adapters.
+    """
+    if not url:
+        return {}
+    if url.startswith("local://"):
+        return {"client_manager": LocalPubSubManager(url)}
+    return {"message_queue": url}
+
+class CommentBroadcaster:
+    """Sends new comments to the room of their video, digesting bursts.
+
+    While a video receives at most ``hot_threshold`` comments per ``window``
+    seconds each one goes out immediately as ``new_comment``. Above that the
+    video is hot: its comments are held and sent every ``interval`` seconds
+    as one ``comment_digest`` event carrying the total count and the newest
+    ``max_comments`` comments, so each viewer gets a few frames per second
+    instead of one per comment.
+    """
+
+    def __init__(self, emit, hot_threshold=HOT_COMMENTS_PER_WINDOW, window=HOT_WINDOW_SECONDS,
+                 interval=DIGEST_INTERVAL, max_comments=MAX_DIGEST_COMMENTS):
+        self.emit = emit
+        self.hot_threshold = hot_threshold
+        self.window = window
+        self.interval = interval
+        self.max_comments = max_comments
+        self._recent = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {"published": 0, "sent": 0, "digested": 0, "digests": 0}
+
+    def start(self):
+        """Start the digest thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="comment-digests", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def publish(self, video_id, comment):
+        """Broadcast ``comment`` to viewers of ``video_id``, or hold it for a digest"""
+        self.start()
+        now = time.monotonic()
+        with self._lock:
+            self._stats["published"] += 1
+            recent = self._recent.setdefault(video_id, deque())
+            recent.append(now)
+            while recent and recent[0] < now - self.window:
+                recent.popleft()
+            if video_id in self._pending or len(recent) > self.hot_threshold:
+                self._pending.setdefault(video_id, []).append(comment)
+                self._stats["digested"] += 1
+                return
+            self._stats["sent"] += 1
+        self.emit("new_comment", comment, to=video_room(video_id))
+
+    def flush(self):
+        """Send one digest per hot video and forget videos that cooled down"""
+        now = time.monotonic()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for video_id in [v for v, recent in self._recent.items() if not recent or recent[-1] < now - self.window]:
+                del self._recent[video_id]
+            self._stats["digests"] += len(pending)
+        for video_id, comments in pending.items():
+            self.emit("comment_digest", {
+                "video_id": video_id,
+                "count": len(comments),
+                "comments": comments[-self.max_comments:]
+            }, to=video_room(video_id))
+        return len(pending)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, hot_videos=len(self._pending), tracked_videos=len(self._recent))
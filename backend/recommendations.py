@@ -0,0 +1,310 @@
+# YouTube Clone - Vectorized recommendation engine
+import threading
+import time
+import zlib
+
+from db import add_column_if_missing, get_db
+from trending import trending
+
+# Tags and categories are hashed into a fixed number of feature columns so the
+# matrix never has to be rebuilt when a new tag appears. Every request reads
+# the whole matrix, (FEATURE_DIM + 1) * 4 bytes per video, so this is kept
+# small enough to score a million videos in well under 10 ms
+FEATURE_DIM = 24
+CATEGORY_WEIGHT = 2.0
+# How much popularity nudges scores relative to tag/category similarity;
+# log1p(views) is divided by POPULARITY_SCALE (about log of a billion views)
+POPULARITY_WEIGHT = 0.1
+POPULARITY_SCALE = 20.0
+# Popularity prior of removed videos, so they sink below every real score
+EXCLUDED = float("-inf")
+HISTORY_LIMIT = 50
+RECENCY_HALF_LIFE_DAYS = 14.0
+REFRESH_INTERVAL = 30.0
+# Rows read and featurized per step of a refresh, so the engine lock is
+# only ever held to copy one finished batch in
+REFRESH_BATCH = 50000
+# Top-k looks inside the blocks with the highest maxima only; capacity is
+# allocated in whole blocks
+TOPK_BLOCK = 1024
+
+_NEXT_CHANGE_SEQ = "(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM videos)"
+
+def track_video_changes(conn):
+    """Number every change to a video's privacy, category or tags.
+
+    ``videos.change_seq`` is set from a single increasing sequence whenever
+    a video is inserted or one of those columns changes, by any writer, so
+    an engine refreshing from the last sequence it saw picks up videos made
+    public after they were uploaded as well as new ones.
+    """
+    add_column_if_missing(conn, "videos", "change_seq", "INTEGER")
+    conn.execute("UPDATE videos SET change_seq = id WHERE change_seq IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_change_seq ON videos (change_seq)")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS videos_change_insert AFTER INSERT ON videos BEGIN
+            UPDATE videos SET change_seq = {_NEXT_CHANGE_SEQ} WHERE id = new.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS videos_change_update AFTER UPDATE OF privacy, category, tags ON videos BEGIN
+            UPDATE videos SET change_seq = {_NEXT_CHANGE_SEQ} WHERE id = new.id;
+        END
+    """)
+
+def feature_vector(category, tags, dim=FEATURE_DIM):
+    """L2-normalised hashed feature vector for one video"""
+    import numpy as np
+
+    vector = np.zeros(dim, dtype=np.float32)
+    if category:
+        vector[zlib.crc32(f"c:{category.strip().lower()}".encode()) % dim] += CATEGORY_WEIGHT
+    if tags:
+        for tag in tags.split(","):
+            tag = tag.strip().lower()
+            if tag:
+                vector[zlib.crc32(f"t:{tag}".encode()) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+class RecommendationEngine:
+    """Scores every public video against a user profile in one mat-vec.
+
+    Public videos are columns of a feature-major float32 matrix, loaded
+    incrementally in change_seq order; its last row holds a popularity
+    prior. A user's profile is the sum of the videos they watched, weighted
+    by watch time and recency.
+
+    The top results are found by taking the ``limit`` blocks of TOPK_BLOCK
+    columns with the highest maximum score and running ``argpartition``
+    over those alone, which is exact.
+
+    NumPy is imported, and the matrix allocated, when the first videos are
+    loaded rather than when the app starts; ``load_async()`` does the first
+    load off the request path.
+    """
+
+    def __init__(self, dim=FEATURE_DIM, refresh_interval=REFRESH_INTERVAL):
+        self.dim = dim
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        # Serializes refreshes; never held by a thread waiting for self._lock
+        self._refresh_lock = threading.Lock()
+        self._size = 0
+        self._ids = None
+        self._features = None
+        self._row_of = {}
+        self._last_seq = 0
+        self._refreshed_at = 0.0
+        # Bumped whenever the candidate set changes, so callers can key caches on it
+        self.version = 0
+
+    def _reserve(self, extra):
+        import numpy as np
+
+        needed = self._size + extra
+        capacity = len(self._ids) if self._ids is not None else 0
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, TOPK_BLOCK)
+        capacity = -(-capacity // TOPK_BLOCK) * TOPK_BLOCK
+        ids = np.zeros(capacity, dtype=np.int64)
+        features = np.zeros((self.dim + 1, capacity), dtype=np.float32)
+        # Unused columns never score
+        features[self.dim, :] = EXCLUDED
+        if self._size:
+            ids[:self._size] = self._ids[:self._size]
+            features[:, :self._size] = self._features[:, :self._size]
+        self._ids, self._features = ids, features
+
+    def add_videos(self, rows):
+        """Append or replace (id, category, tags, views_count) rows"""
+        import numpy as np
+
+        # Featurized before taking the lock, which is held only for the copy
+        features = np.empty((self.dim + 1, len(rows)), dtype=np.float32)
+        for index, (_, category, tags, views) in enumerate(rows):
+            features[:self.dim, index] = feature_vector(category, tags, self.dim)
+            features[self.dim, index] = np.log1p(views or 0) / POPULARITY_SCALE
+        with self._lock:
+            self._reserve(len(rows))
+            columns = []
+            for video_id, _, _, _ in rows:
+                column = self._row_of.get(video_id)
+                if column is None:
+                    column = self._size
+                    self._size += 1
+                    self._row_of[video_id] = column
+                    self._ids[column] = video_id
+                columns.append(column)
+            self._features[:, columns] = features
+            self.version += 1
+
+    def remove_video(self, video_id):
+        """Stop recommending a video (deleted or no longer public)"""
+        with self._lock:
+            column = self._row_of.get(video_id)
+            if column is not None:
+                self._features[:self.dim, column] = 0.0
+                self._features[self.dim, column] = EXCLUDED
+                self.version += 1
+
+    def refresh(self, force=False):
+        """Apply videos uploaded or changed since the last refresh.
+
+        The rows are read before the engine lock is taken, so a refresh
+        waiting for a pooled connection never blocks requests that hold
+        one. A call made while another refresh runs returns at once.
+        """
+        if not force and time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=force):
+            return
+        try:
+            while True:
+                with get_db() as conn:
+                    rows = conn.execute("""
+                        SELECT id, category, tags, views_count, privacy, change_seq FROM videos
+                        WHERE change_seq > ?
+                        ORDER BY change_seq
+                        LIMIT ?
+                    """, (self._last_seq, REFRESH_BATCH)).fetchall()
+                public = [row[:4] for row in rows if row[4] == "public"]
+                if public:
+                    self.add_videos(public)
+                for row in rows:
+                    if row[4] != "public":
+                        self.remove_video(row[0])
+                if rows:
+                    self._last_seq = rows[-1][5]
+                if len(rows) < REFRESH_BATCH:
+                    break
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def load_async(self):
+        """Start the first full load on a background thread.
+
+        Requests arriving meanwhile skip the refresh in progress and fall
+        back to trending until the videos they need are loaded.
+        """
+        thread = threading.Thread(target=self.refresh, kwargs={"force": True},
+                                  name="recommendations-load", daemon=True)
+        thread.start()
+        return thread
+
+    def update_video(self, conn, video_id):
+        """Re-read one video after its tags, category or privacy changed"""
+        row = conn.execute(
+            "SELECT id, category, tags, views_count, privacy FROM videos WHERE id = ?", (video_id,)
+        ).fetchone()
+        if row is None or row[4] != "public":
+            self.remove_video(video_id)
+        else:
+            self.add_videos([row[:4]])
+
+    def profile(self, history):
+        """Weighted profile vector from (video_id, watch_time, age_days) rows.
+
+        Returns the profile and the matrix columns of the watched videos, or
+        (None, columns) when nothing in the history is known to the engine.
+        """
+        import numpy as np
+
+        with self._lock:
+            columns = []
+            weights = []
+            for video_id, watch_time, age_days in history:
+                column = self._row_of.get(video_id)
+                if column is None:
+                    continue
+                columns.append(column)
+                recency = 0.5 ** (max(age_days or 0.0, 0.0) / RECENCY_HALF_LIFE_DAYS)
+                weights.append(np.log1p(max(watch_time or 0, 0)) * recency + 1e-3)
+            if not columns:
+                return None, columns
+            vector = self._features[:self.dim, columns] @ np.asarray(weights, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return np.append(vector, np.float32(POPULARITY_WEIGHT)), columns
+
+    def top_k(self, profile, limit, exclude_rows=()):
+        """Ids of the ``limit`` best-scoring active videos for a profile"""
+        import numpy as np
+
+        with self._lock:
+            if self._size == 0:
+                return []
+            # Arrays are replaced, never resized, when capacity grows; a
+            # column written while this scores it is at worst one refresh old
+            used = -(-self._size // TOPK_BLOCK) * TOPK_BLOCK
+            ids, features = self._ids, self._features[:, :used]
+
+        scores = profile @ features
+        if len(exclude_rows):
+            scores[list(exclude_rows)] = EXCLUDED
+        # Every top-k column lies in one of the ``limit`` blocks with the highest maxima
+        block_best = scores.reshape(-1, TOPK_BLOCK).max(axis=1)
+        blocks = min(limit, len(block_best))
+        top_blocks = np.argpartition(block_best, len(block_best) - blocks)[len(block_best) - blocks:]
+        candidates = (top_blocks[:, None] * TOPK_BLOCK + np.arange(TOPK_BLOCK)).ravel()
+        count = min(limit, len(candidates))
+        best = candidates[np.argpartition(scores[candidates], len(candidates) - count)[len(candidates) - count:]]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [int(ids[column]) for column in best if np.isfinite(scores[column])]
+
+    def get_recommendations(self, user_id, limit=20):
+        """Generate video recommendations based on watch history"""
+        self.refresh()
+        with get_db() as conn:
+            history = conn.execute("""
+                SELECT video_id, watch_time, julianday('now') - julianday(last_watched)
+                FROM watch_history
+                WHERE user_id = ?
+                ORDER BY last_watched DESC LIMIT ?
+            """, (user_id, HISTORY_LIMIT)).fetchall()
+
+        # Scored with the connection back in the pool: the engine lock is
+        # never taken while holding one
+        profile, watched = self.profile(history)
+        video_ids = self.top_k(profile, limit, exclude_rows=watched) if profile is not None else []
+        if not video_ids:
+            video_ids = trending.top(limit)
+        if not video_ids:
+            return []
+        with get_db() as conn:
+            return video_cards(conn, video_ids)
+
+def _card(row):
+    return {
+        "id": row[0],
+        "title": row[1],
+        "thumbnail": row[2],
+        "views": row[3],
+        "duration": row[4],
+        "channel": row[5],
+        "channel_avatar": row[6]
+    }
+
+def video_cards(conn, video_ids):
+    """Recommendation cards for video ids, in the given order"""
+    placeholders = ", ".join("?" * len(video_ids))
+    rows = conn.execute(f"""
+        SELECT v.id, v.title, v.thumbnail, v.views_count, v.duration, u.channel_name, u.avatar
+        FROM videos v
+        JOIN users u ON v.user_id = u.id
+        WHERE v.id IN ({placeholders}) AND v.privacy = 'public'
+    """, video_ids).fetchall()
+    by_id = {row[0]: _card(row) for row in rows}
+    return [by_id[video_id] for video_id in video_ids if video_id in by_id]
+
+def trending_videos(conn, limit, category=None):
+    """Trending public videos, used when there is no usable history"""
+    video_ids = trending.top(limit, category)
+    return video_cards(conn, video_ids) if video_ids else []
+
+recommender = RecommendationEngine()
@@ -0,0 +1,114 @@
+# YouTube Clone - Full-text video search
+import html
+import re
+
+# BM25 column weights for (title, description, tags)
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+# FTS5 wraps matches in these control characters; the text around them is
+# user input, so it is HTML-escaped before they become <mark> tags
+_MATCH_OPEN = "\x02"
+_MATCH_CLOSE = "\x03"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Every search box word is a prefix query; FTS5 keeps separate indexes of
+# the 2- and 3-character prefixes of each term so short ones do not have to
+# scan every term that starts with them
+PREFIX_INDEXES = "2 3"
+
+def create_search_index(conn):
+    """Create the FTS5 index over videos and its sync triggers.
+
+    The index is an external-content table, so it stores only the inverted
+    index and reads column values back from ``videos``. When the index is
+    created against an existing database it is backfilled from every row.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'videos_fts'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+            title, description, tags,
+            content='videos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='{PREFIX_INDEXES}'
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+            INSERT INTO videos_fts (rowid, title, description, tags)
+            VALUES (new.id, new.title, new.description, new.tags);
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+            INSERT INTO videos_fts (videos_fts, rowid, title, description, tags)
+            VALUES ('delete', old.id, old.title, old.description, old.tags);
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF title, description, tags ON videos BEGIN
+            INSERT INTO videos_fts (videos_fts, rowid, title, description, tags)
+            VALUES ('delete', old.id, old.title, old.description, old.tags);
+            INSERT INTO videos_fts (rowid, title, description, tags)
+            VALUES (new.id, new.title, new.description, new.tags);
+        END
+    """)
+
+    if not exists:
+        # Backfill rows that were inserted before the index existed
+        cursor.execute("INSERT INTO videos_fts (videos_fts) VALUES ('rebuild')")
+
+def add_prefix_indexes(conn):
+    """Rebuild an index created without prefix indexes.
+
+    FTS5 options are fixed when the table is created, so the table is
+    dropped and created again, then backfilled from ``videos``. The sync
+    triggers live on ``videos`` and are kept.
+    """
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'videos_fts'").fetchone()
+    if row is not None and f"prefix='{PREFIX_INDEXES}'" in row[0]:
+        return
+    conn.execute("DROP TABLE IF EXISTS videos_fts")
+    create_search_index(conn)
+
+def build_match_query(search):
+    """Turn free text from the search box into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term so that user input can never be
+    parsed as FTS5 syntax, and partially typed words still match.
+    Returns None when the text contains no searchable words.
+    """
+    tokens = _TOKEN_RE.findall(search)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def rank_expression():
+    """SQL expression ranking videos_fts matches by weighted BM25 (lower is better)"""
+    weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+    return f"bm25(videos_fts, {weights})"
+
+def snippet_columns():
+    """SQL select list producing marked title and description snippets.
+
+    Pass each value through render_highlight() before returning it.
+    """
+    return (
+        f"highlight(videos_fts, 0, char({ord(_MATCH_OPEN)}), char({ord(_MATCH_CLOSE)})), "
+        f"snippet(videos_fts, 1, char({ord(_MATCH_OPEN)}), char({ord(_MATCH_CLOSE)}), '…', 24)"
+    )
+
+def render_highlight(marked):
+    """HTML-escape a highlight()/snippet() value and wrap its matches in <mark>"""
+    if marked is None:
+        return None
+    escaped = html.escape(marked)
+    return escaped.replace(_MATCH_OPEN, HIGHLIGHT_OPEN).replace(_MATCH_CLOSE, HIGHLIGHT_CLOSE)
@@ -0,0 +1,195 @@
+# YouTube Clone - HTTP range streaming of video files
+import io
+import mimetypes
+import mmap
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+from flask import Response
+
+CHUNK_SIZE = 256 * 1024
+MAX_STREAMS_PER_CLIENT = 4
+
+class StreamSlots:
+    """Caps how many responses a single client may be streaming at once"""
+
+    def __init__(self, limit=MAX_STREAMS_PER_CLIENT):
+        self.limit = limit
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client):
+        with self._lock:
+            count = self._active.get(client, 0)
+            if count >= self.limit:
+                return False
+            self._active[client] = count + 1
+            return True
+
+    def release(self, client):
+        with self._lock:
+            count = self._active.get(client, 0) - 1
+            if count > 0:
+                self._active[client] = count
+            else:
+                self._active.pop(client, None)
+
+    def active(self):
+        with self._lock:
+            return sum(self._active.values())
+
+def parse_range(header, size):
+    """Resolve a single ``bytes=`` range to inclusive (start, end).
+
+    Returns None when the header is absent, malformed or asks for several
+    ranges (which we answer with the full body, as RFC 9110 allows), and
+    raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start is None:
+        if end is None:
+            return None
+        if end == 0:
+            raise ValueError(header)
+        start, end = max(size - end, 0), size - 1
+    elif end is None:
+        end = size - 1
+    if start >= size:
+        raise ValueError(header)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+def _etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def _not_modified_since(value, stat):
+    try:
+        return int(stat.st_mtime) <= parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def _range_still_valid(if_range, etag, stat):
+    """If-Range matches only an unchanged strong ETag or Last-Modified date"""
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    try:
+        return int(stat.st_mtime) == int(parsedate_to_datetime(if_range).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+class _MappedBody:
+    """Iterates a byte range of a file in CHUNK_SIZE pieces read from an mmap.
+
+    WSGI servers require bytes, so each chunk is one bounded copy out of the
+    page cache; memory per stream stays at a single chunk however large the
+    range.
+    """
+
+    def __init__(self, path, start, length, on_close):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if length else None
+        self._start = start
+        self._length = length
+        self._on_close = on_close
+
+    def __iter__(self):
+        if self._map is None:
+            return
+        offset = self._start
+        end = self._start + self._length
+        while offset < end:
+            step = min(CHUNK_SIZE, end - offset)
+            yield self._map[offset:offset + step]
+            offset += step
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+class _TrackedFile(io.FileIO):
+    """File handed to the server's sendfile wrapper; releases the slot on close"""
+
+    def __init__(self, path, on_close):
+        super().__init__(path, "rb")
+        self._on_close = on_close
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+        super().close()
+
+def stream_file(request, path, slots):
+    """Build a 200/206/304/416 response for a video file with range support.
+
+    When the body runs to the end of the file and the WSGI server offers
+    ``wsgi.file_wrapper`` (gunicorn, uWSGI), the file is handed over
+    positioned at the range start so the server can use os.sendfile.
+    Bounded ranges, and servers without a file wrapper, stream from an mmap.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = _etag(stat)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "public, max-age=86400",
+    }
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status=304, headers=headers)
+    elif request.headers.get("If-Modified-Since") and _not_modified_since(request.headers["If-Modified-Since"], stat):
+        return Response(status=304, headers=headers)
+
+    status = 200
+    start, length = 0, size
+    if _range_still_valid(request.headers.get("If-Range"), etag, stat):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    client = request.remote_addr or "unknown"
+    if not slots.acquire(client):
+        return Response(status=429, headers={"Retry-After": "1"})
+    release = lambda: slots.release(client)
+
+    try:
+        file_wrapper = request.environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None and length and start + length == size:
+            handle = _TrackedFile(path, release)
+            handle.seek(start)
+            body = file_wrapper(handle, CHUNK_SIZE)
+        else:
+            body = _MappedBody(path, start, length, release)
+    except OSError:
+        release()
+        raise
+
+    headers["Content-Length"] = str(length)
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
@@ -0,0 +1,236 @@
+# YouTube Clone - Materialized trending feed with time-decayed scores
+import bisect
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from buffers import WriteBehindBuffer
+from cache import TTLCache
+from db import get_db
+
+# Engagement decays with a one-day half-life: a view from yesterday counts
+# half as much as one now. Scores are stored as
+#     log(sum(weight * exp((event_time - EPOCH) / TAU)))
+# which orders videos exactly like the decayed sum at any moment, only grows
+# as events arrive, and never has to be decayed in place. Changing EPOCH or
+# TAU requires rebuild_trending().
+HALF_LIFE_HOURS = 24.0
+TAU = HALF_LIFE_HOURS * 3600 / math.log(2)
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+VIEW_WEIGHT = 1.0
+LIKE_WEIGHT = 5.0
+COMMENT_WEIGHT = 10.0
+# Videos kept per category list; requests deeper than this are clamped
+TRENDING_DEPTH = 200
+REFRESH_INTERVAL = 30.0
+# Ids per lookup while flushing, under SQLite's bound parameter limit
+LOOKUP_BATCH = 500
+# A user's like credits a video once per half-life, however often they
+# toggle it; (user, video) pairs remembered for that long in each process
+LIKE_CREDIT_ENTRIES = 200000
+
+_EPOCH_SECONDS = EPOCH.timestamp()
+_EPOCH_SQL = EPOCH.strftime("%Y-%m-%d %H:%M:%S")
+
+def _logaddexp(a, b):
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+def decayed_log_weight(weight, at):
+    """Log score contributed by an event of ``weight`` at unix time ``at``"""
+    return math.log(weight) + (at - _EPOCH_SECONDS) / TAU
+
+def _prior(views, likes, comments, uploaded_after_epoch):
+    # Lifetime engagement credited at upload time: old hits decay away while
+    # new uploads with the same counts rank above them
+    weight = 1.0 + VIEW_WEIGHT * (views or 0) + LIKE_WEIGHT * (likes or 0) + COMMENT_WEIGHT * (comments or 0)
+    return decayed_log_weight(weight, _EPOCH_SECONDS + (uploaded_after_epoch or 0.0))
+
+def _seconds_after_epoch(column):
+    return f"(julianday({column}) - julianday('{_EPOCH_SQL}')) * 86400.0"
+
+def create_trending_table(conn):
+    """Create trending_scores, its triggers, and backfill it from videos.
+
+    Triggers keep the set of rows in step with public videos: uploads start
+    at the score of a single view at upload time, and videos that are
+    deleted or leave public drop out. Engagement is added by TrendingFeed.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trending_scores (
+            video_id INTEGER PRIMARY KEY,
+            category TEXT,
+            score REAL NOT NULL,
+            FOREIGN KEY (video_id) REFERENCES videos (id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trending_score ON trending_scores (score)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trending_category ON trending_scores (category, score)")
+
+    upload_score = f"{_seconds_after_epoch('new.upload_date')} / {TAU!r}"
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trending_insert AFTER INSERT ON videos
+        WHEN new.privacy = 'public' BEGIN
+            INSERT OR IGNORE INTO trending_scores (video_id, category, score)
+            VALUES (new.id, new.category, {upload_score});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trending_update AFTER UPDATE OF privacy, category ON videos BEGIN
+            DELETE FROM trending_scores WHERE video_id = new.id AND new.privacy != 'public';
+            INSERT INTO trending_scores (video_id, category, score)
+            SELECT new.id, new.category, {upload_score} WHERE new.privacy = 'public'
+            ON CONFLICT (video_id) DO UPDATE SET category = excluded.category;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trending_delete AFTER DELETE ON videos BEGIN
+            DELETE FROM trending_scores WHERE video_id = old.id;
+        END
+    """)
+    rebuild_trending(conn)
+
+def rebuild_trending(conn):
+    """Recompute every score from the stored counters (after bulk loads)"""
+    conn.create_function("trending_prior", 4, _prior, deterministic=True)
+    conn.execute("DELETE FROM trending_scores")
+    conn.execute(f"""
+        INSERT INTO trending_scores (video_id, category, score)
+        SELECT id, category, trending_prior(views_count, likes_count, comments_count,
+                                            {_seconds_after_epoch('upload_date')})
+        FROM videos WHERE privacy = 'public'
+    """)
+
+class _TopK:
+    """Highest-scoring ids of one category, kept sorted"""
+
+    def __init__(self, rows, depth, loaded_at):
+        self.depth = depth
+        self.loaded_at = loaded_at
+        self.scores = {video_id: score for video_id, score in rows}
+        self.entries = sorted((-score, -video_id) for video_id, score in rows)
+
+    def discard(self, video_id):
+        score = self.scores.pop(video_id, None)
+        if score is not None:
+            entry = (-score, -video_id)
+            del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def update(self, video_id, score):
+        """Place a video at its new (higher) score if it makes the cut"""
+        self.discard(video_id)
+        entry = (-score, -video_id)
+        if len(self.entries) >= self.depth and entry >= self.entries[-1]:
+            return
+        bisect.insort(self.entries, entry)
+        self.scores[video_id] = score
+        if len(self.entries) > self.depth:
+            _, evicted = self.entries.pop()
+            del self.scores[-evicted]
+
+    def top(self, limit):
+        return [-video_id for _, video_id in self.entries[:limit]]
+
+class TrendingFeed(WriteBehindBuffer):
+    """Time-decayed trending scores, persisted and served from memory.
+
+    Views, likes and comments are buffered per video as decayed log weights
+    and folded into trending_scores in batches. Scores only ever grow, so
+    the top ``depth`` videos of each category (and of all categories,
+    keyed None) stay exact when each flush re-places just the videos it
+    touched; a list is loaded through the score indexes on first use and
+    reloaded every ``refresh_interval`` to pick up other processes' writes
+    and videos that left public.
+    """
+
+    def __init__(self, depth=TRENDING_DEPTH, refresh_interval=REFRESH_INTERVAL, **kwargs):
+        super().__init__("trending", on_flush=self._place, **kwargs)
+        self.depth = depth
+        self.refresh_interval = refresh_interval
+        self._lists = {}
+        self._lists_lock = threading.Lock()
+        self._liked = TTLCache(max_entries=LIKE_CREDIT_ENTRIES, ttl=HALF_LIFE_HOURS * 3600)
+        self._liked_lock = threading.Lock()
+        # New scores of the batch being flushed, placed once it commits
+        self._written = []
+
+    def _merge(self, older, newer):
+        return _logaddexp(older, newer)
+
+    def _write(self, conn, items):
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        current = {}
+        for start in range(0, len(items), LOOKUP_BATCH):
+            video_ids = [video_id for video_id, _ in items[start:start + LOOKUP_BATCH]]
+            rows = conn.execute(f"""
+                SELECT video_id, category, score FROM trending_scores WHERE video_id IN ({", ".join("?" * len(video_ids))})
+            """, video_ids).fetchall()
+            current.update((video_id, (category, score)) for video_id, category, score in rows)
+        # Videos without a row are not public (or no longer exist)
+        updated = [
+            (video_id, current[video_id][0], _logaddexp(current[video_id][1], weight))
+            for video_id, weight in items if video_id in current
+        ]
+        conn.executemany("UPDATE trending_scores SET score = ? WHERE video_id = ?",
+                         [(score, video_id) for video_id, _, score in updated])
+        self._written = updated
+
+    def _place(self, items):
+        updated, self._written = self._written, []
+        with self._lists_lock:
+            for video_id, category, score in updated:
+                # None keys the list across all categories
+                for key in {None, category}:
+                    ranking = self._lists.get(key)
+                    if ranking is not None:
+                        ranking.update(video_id, score)
+
+    def record(self, video_id, views=0, likes=0, comments=0):
+        """Credit engagement to a video as of now"""
+        weight = VIEW_WEIGHT * views + LIKE_WEIGHT * likes + COMMENT_WEIGHT * comments
+        if weight > 0:
+            self._put(video_id, decayed_log_weight(weight, time.time()))
+
+    def record_like(self, user_id, video_id):
+        """Credit a like unless this user's like on the video was credited
+        within the last half-life; returns True if it counted"""
+        with self._liked_lock:
+            if self._liked.get((user_id, video_id)) is not None:
+                return False
+            self._liked.set((user_id, video_id), True)
+        self.record(video_id, likes=1)
+        return True
+
+    def _load(self, conn, category):
+        if category is None:
+            rows = conn.execute("""
+                SELECT video_id, score FROM trending_scores ORDER BY score DESC, video_id DESC LIMIT ?
+            """, (self.depth,)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT video_id, score FROM trending_scores WHERE category = ?
+                ORDER BY score DESC, video_id DESC LIMIT ?
+            """, (category, self.depth)).fetchall()
+        return _TopK(rows, self.depth, time.monotonic())
+
+    def top(self, limit, category=None):
+        """Ids of the ``limit`` (at most ``depth``) trending videos, best first"""
+        with self._lists_lock:
+            ranking = self._lists.get(category)
+            if ranking is not None and time.monotonic() - ranking.loaded_at < self.refresh_interval:
+                return ranking.top(limit)
+        with get_db() as conn:
+            ranking = self._load(conn, category)
+        with self._lists_lock:
+            self._lists[category] = ranking
+        return ranking.top(limit)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lists_lock:
+            stats["lists"] = len(self._lists)
+        return stats
+
+trending = TrendingFeed(interval=2.0, max_pending=500)